@@ -0,0 +1,55 @@
+"""Normalization helpers shared by the SQLite readers and writers."""
+
+import re
+from datetime import date, datetime
+from typing import Any, Optional
+
+import pandas as pd
+
+# YYYY-MM-DD anywhere in a string (e.g. weekly research headers)
+DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+# Leading/trailing whitespace and quotes left over from external data sources
+QUOTE_STRIP_RE = re.compile(r"^[\s\"']+|[\s\"']+$")
+
+
+def clean_ticker(t: str) -> str:
+    # Normalize tickers coming from external data sources
+    return QUOTE_STRIP_RE.sub("", t)
+
+
+def clean_ticker_series(tickers: pd.Series) -> pd.Series:
+    """Vectorized `clean_ticker` for a whole column."""
+    return tickers.astype("string").str.replace(QUOTE_STRIP_RE, "", regex=True)
+
+
+def unique_tickers(tickers: pd.Series) -> list[str]:
+    """Stripped, non-empty, non-null tickers in first-seen order."""
+    values = tickers.astype("string").str.strip()
+    # Filter and dedupe stay inside pandas; only the result becomes a list
+    return values[values.notna() & values.ne("")].drop_duplicates().tolist()
+
+
+def to_iso_date(value: Any) -> Optional[str]:
+    """Return the calendar day of `value` as YYYY-MM-DD, or None if unparseable.
+
+    date/datetime objects and ISO date strings are handled without pandas;
+    anything else falls back to `pd.to_datetime`.
+    """
+    if value is pd.NaT:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value).isoformat()
+        except ValueError:
+            pass
+    try:
+        ts = pd.to_datetime(value, errors="coerce")
+    except Exception:
+        return None
+    if pd.isna(ts):
+        return None
+    return ts.date().isoformat()
@@ -1,106 +1,227 @@
+import os
+import threading
+import time
+from functools import lru_cache
+
 import pandas as pd
-import re
-from typing import List, Dict, Any, Tuple, Optional
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+
+from app.data._common import DATE_RE, clean_ticker_series, to_iso_date
+from app.data.db import df_from_query, fetchone_query, read_connection, transaction
+from portfolio_manager import Portfolio
 
-from data.db import bootstrap_db, df_from_query
-from portfolio_manager import Portfolio, PortfolioPosition
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_FETCH_TIMEOUT_SECONDS = 30.0
+# Yahoo accepts roughly 20 symbols per request before URLs get unwieldy
+FETCH_BATCH_SIZE = 20
+QUOTE_CACHE_TTL_SECONDS = 60.0
+QUOTE_CACHE_MAXSIZE = 1024
 
+# (ticker, UTC day) -> (monotonic fetch time, frame) for `get_stock_data`
+_QUOTE_CACHE: Dict[Tuple[str, str], Tuple[float, pd.DataFrame]] = {}
+_QUOTE_CACHE_LOCK = threading.Lock()
 
-def get_stock_data(stocksTickers: List[str]):
-    import yfinance as yf  # imported here to avoid dependency for other helpers
-    dailyData = []
 
-    for ticker in stocksTickers:
-        dat = yf.Ticker(ticker)
-        dailyData.append(dat.history(period="1d"))
+# yfinance module handle, imported on first use by `_yfinance`
+_YF = None
 
-    return dailyData
 
+def _yfinance():
+    """Import yfinance on first use and reuse the module handle afterwards.
 
-def _clean_ticker(t: str) -> str:
-    # Normalize tickers coming from external data sources
-    return t.strip().strip('"').strip("'")
+    Its import chain (requests, bs4, curl_cffi, ...) is heavy, and most
+    helpers in this module never need it.
+    """
+    global _YF
+    if _YF is None:
+        import yfinance
+
+        _YF = yfinance
+    return _YF
+
+
+def get_stock_data(
+    stocksTickers: List[str],
+    *,
+    max_workers: int = DEFAULT_FETCH_WORKERS,
+    timeout: Optional[float] = DEFAULT_FETCH_TIMEOUT_SECONDS,
+    cache_ttl: float = QUOTE_CACHE_TTL_SECONDS,
+) -> List[Optional[pd.DataFrame]]:
+    """Fetch the latest daily candle for each ticker from yfinance.
+
+    Tickers are sent in batches of `FETCH_BATCH_SIZE` through `yf.download`,
+    which fans the symbols of a batch out over `max_workers` threads. Batches
+    run one after another because `yf.download` keeps its results in
+    module-global state. Results keep the order of `stocksTickers`; a ticker
+    whose download fails yields `None` instead of aborting the whole batch.
+
+    Successful fetches are cached per (ticker, UTC day) for `cache_ttl`
+    seconds, so rapid repeat calls skip the network; pass 0 to bypass.
+    """
+    frames_by_ticker: Dict[str, Optional[pd.DataFrame]] = {}
+    missing: List[str] = []
+    for ticker in dict.fromkeys(stocksTickers):
+        cached = _get_cached_quote(ticker, cache_ttl)
+        if cached is None:
+            missing.append(ticker)
+        else:
+            frames_by_ticker[ticker] = cached
+
+    yf = _yfinance() if missing else None
+    for start in range(0, len(missing), FETCH_BATCH_SIZE):
+        chunk = missing[start : start + FETCH_BATCH_SIZE]
+        try:
+            data = yf.download(
+                " ".join(chunk),
+                period="1d",
+                group_by="ticker",
+                actions=True,
+                auto_adjust=True,
+                threads=max(1, min(max_workers, len(chunk))),
+                progress=False,
+                timeout=timeout,
+            )
+        except Exception as exc:
+            print(f"[collector] Failed to fetch market data for {chunk}: {exc}")
+            data = None
+        fetched = _split_download(data, chunk)
+        _store_quotes(fetched)
+        frames_by_ticker.update(fetched)
+
+    return [frames_by_ticker.get(ticker) for ticker in stocksTickers]
+
+
+def _quote_cache_key(ticker: str) -> Tuple[str, str]:
+    return ticker, datetime.now(timezone.utc).date().isoformat()
+
+
+def _get_cached_quote(ticker: str, ttl: float) -> Optional[pd.DataFrame]:
+    if ttl <= 0:
+        return None
+    key = _quote_cache_key(ticker)
+    with _QUOTE_CACHE_LOCK:
+        entry = _QUOTE_CACHE.get(key)
+        if entry is None:
+            return None
+        fetched_at, frame = entry
+        if time.monotonic() - fetched_at > ttl:
+            del _QUOTE_CACHE[key]
+            return None
+        return frame
+
+
+def _store_quotes(frames: Dict[str, Optional[pd.DataFrame]]) -> None:
+    now = time.monotonic()
+    with _QUOTE_CACHE_LOCK:
+        for ticker, frame in frames.items():
+            if frame is not None:
+                _QUOTE_CACHE[_quote_cache_key(ticker)] = (now, frame)
+        # Evict the oldest entries once the cache outgrows its bound
+        overflow = len(_QUOTE_CACHE) - QUOTE_CACHE_MAXSIZE
+        if overflow > 0:
+            for key, _ in sorted(_QUOTE_CACHE.items(), key=lambda kv: kv[1][0])[:overflow]:
+                del _QUOTE_CACHE[key]
+
+
+def _split_download(
+    data: Optional[pd.DataFrame], tickers: List[str]
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """Split a `group_by="ticker"` download into one DataFrame per ticker."""
+    if data is None or data.empty or not isinstance(data.columns, pd.MultiIndex):
+        return {ticker: None for ticker in tickers}
+
+    available = set(data.columns.get_level_values(0))
+    frames: Dict[str, Optional[pd.DataFrame]] = {}
+    for ticker in tickers:
+        # yfinance upper-cases symbols before keying the result columns
+        key = ticker if ticker in available else ticker.upper()
+        if key not in available:
+            frames[ticker] = None
+            continue
+        frame = data[key].dropna(how="all").rename_axis(None, axis=1)
+        frames[ticker] = None if frame.empty else frame
+    return frames
 
 
 ## Removed: get_portfolio_tickers. Use get_all_positions() and filter by latest date in orchestrator.
 
 
+def _cash_row_to_dict(row) -> Dict[str, Any]:
+    """Map a `cash` row (date, amount, total_portfolio_amount) to a dict."""
+    if row is None:
+        return {"date": None, "amount": None, "total_portfolio_amount": None}
+    date_val = pd.to_datetime(row["date"], errors="coerce")
+    return {
+        "date": None if pd.isna(date_val) else date_val,
+        "amount": row["amount"],
+        "total_portfolio_amount": row["total_portfolio_amount"],
+    }
+
+
+_LATEST_CASH_SQL = (
+    "SELECT date, amount, total_portfolio_amount FROM cash ORDER BY date DESC LIMIT 1"
+)
+_ALL_POSITIONS_SQL = "SELECT date, ticker, qty, avg_price FROM positions"
+_LATEST_POSITIONS_SQL = """
+    SELECT date, ticker, qty, avg_price
+    FROM positions AS p
+    WHERE date = (
+        SELECT MAX(date) FROM positions WHERE ticker = p.ticker
+    )
+    """
+_ORDER_COLUMNS = ["date", "ticker", "qty", "price"]
+
+
 def get_latest_cash() -> Dict[str, Any]:
     """Return the latest cash information from SQLite.
 
     Returns a dict with keys: `date`, `amount`, `total_portfolio_amount`.
     """
-    bootstrap_db()
-    df = df_from_query(
-        "SELECT date, amount, total_portfolio_amount FROM cash ORDER BY date DESC LIMIT 1"
-    )
-    if df.empty:
-        return {"date": None, "amount": None, "total_portfolio_amount": None}
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    row = df.iloc[0]
-    return {
-        "date": row["date"],
-        "amount": row.get("amount"),
-        "total_portfolio_amount": row.get("total_portfolio_amount"),
-    }
+    return _cash_row_to_dict(fetchone_query(_LATEST_CASH_SQL))
 
 
-def get_latest_cash_before(as_of) -> Dict[str, Any]:
+def get_latest_cash_before(as_of, *, conn=None) -> Dict[str, Any]:
     """Return the latest cash row strictly before a given date.
 
     Args:
         as_of: str/date/datetime. Rows with date < as_of are eligible.
+        conn: Optional connection to read on (e.g. inside a write transaction).
     Returns dict with keys: `date`, `amount`, `total_portfolio_amount`, or
     all None if none exists.
     """
-    bootstrap_db()
-    try:
-        as_of_dt = pd.to_datetime(as_of, errors="coerce")
-    except Exception:
-        as_of_dt = pd.NaT
-    if pd.isna(as_of_dt):
+    as_of_str = to_iso_date(as_of)
+    if as_of_str is None:
         return {"date": None, "amount": None, "total_portfolio_amount": None}
 
-    as_of_str = as_of_dt.date().strftime("%Y-%m-%d")
-    df = df_from_query(
+    row = fetchone_query(
         "SELECT date, amount, total_portfolio_amount FROM cash WHERE date < ? ORDER BY date DESC LIMIT 1",
         params=[as_of_str],
+        conn=conn,
     )
-    if df.empty:
-        return {"date": None, "amount": None, "total_portfolio_amount": None}
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    row = df.iloc[0]
-    return {
-        "date": row["date"],
-        "amount": row.get("amount"),
-        "total_portfolio_amount": row.get("total_portfolio_amount"),
-    }
+    return _cash_row_to_dict(row)
 
 
-def get_all_positions() -> pd.DataFrame:
-    """Load and return the full positions dataset from SQLite."""
-    bootstrap_db()
-    df = df_from_query("SELECT date, ticker, qty, avg_price FROM positions")
-    if not df.empty:
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        if "ticker" in df.columns:
-            df["ticker"] = df["ticker"].astype(str).map(_clean_ticker)
+def _clean_tickers(df: pd.DataFrame) -> pd.DataFrame:
+    if not df.empty and "ticker" in df.columns:
+        df["ticker"] = clean_ticker_series(df["ticker"])
     return df
 
 
-def get_latest_orders(start_date: Optional[Any] = None) -> pd.DataFrame:
-    """Return order rows for yesterday or orders on/after a given date.
+def get_all_positions(latest_only: bool = False, *, conn=None) -> pd.DataFrame:
+    """Load and return the positions dataset from SQLite.
 
     Args:
-        start_date: Optional date (str/datetime). If provided, returns all rows
-            with `date` >= start_date. If omitted, returns rows for yesterday's
-            calendar date.
+        latest_only: When True, only the most recent row per ticker is
+            returned, filtered inside SQLite instead of in pandas.
+        conn: Optional connection to read on (e.g. inside a write transaction).
     """
-    bootstrap_db()
-    query: str
-    params: List[Any] = []
+    query = _LATEST_POSITIONS_SQL if latest_only else _ALL_POSITIONS_SQL
+    return _clean_tickers(df_from_query(query, parse_dates=["date"], conn=conn))
+
 
+def _orders_query(start_date: Optional[Any]) -> Optional[Tuple[str, List[Any]]]:
+    """Build the `get_latest_orders` query; None when `start_date` is invalid."""
     if start_date is None:
         target_date = (datetime.now().date() - timedelta(days=1)).strftime("%Y-%m-%d")
         query = (
@@ -111,29 +232,77 @@ def get_latest_orders(start_date: Optional[Any] = None) -> pd.DataFrame:
             ORDER BY rowid
             """
         )
-        params = [target_date]
-    else:
-        start_dt = pd.to_datetime(start_date, errors="coerce")
-        if pd.isna(start_dt):
-            return pd.DataFrame(columns=["date", "ticker", "qty", "price"])
-        start_str = start_dt.strftime("%Y-%m-%d")
-        query = (
-            """
-            SELECT date, ticker, qty, price
-            FROM orders
-            WHERE date >= ?
-            ORDER BY date, rowid
-            """
-        )
-        params = [start_str]
-
-    df = df_from_query(query, params=params)
-    if df.empty:
-        return df
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    if "ticker" in df.columns:
-        df["ticker"] = df["ticker"].astype(str).map(_clean_ticker)
-    return df
+        return query, [target_date]
+
+    start_str = to_iso_date(start_date)
+    if start_str is None:
+        return None
+    query = (
+        """
+        SELECT date, ticker, qty, price
+        FROM orders
+        WHERE date >= ?
+        ORDER BY date, rowid
+        """
+    )
+    return query, [start_str]
+
+
+def get_latest_orders(start_date: Optional[Any] = None) -> pd.DataFrame:
+    """Return order rows for yesterday or orders on/after a given date.
+
+    Args:
+        start_date: Optional date (str/datetime). If provided, returns all rows
+            with `date` >= start_date. If omitted, returns rows for yesterday's
+            calendar date.
+    """
+    orders_query = _orders_query(start_date)
+    if orders_query is None:
+        return pd.DataFrame(columns=_ORDER_COLUMNS)
+    query, params = orders_query
+    return _clean_tickers(df_from_query(query, params=params, parse_dates=["date"]))
+
+
+class LatestSnapshot(NamedTuple):
+    """Cash, orders and latest positions read from one database snapshot."""
+
+    cash: Dict[str, Any]
+    orders: pd.DataFrame
+    positions: pd.DataFrame
+
+
+def get_latest_snapshot(orders_start_date: Optional[Any] = None) -> LatestSnapshot:
+    """Return what `get_latest_cash`, `get_latest_orders(orders_start_date)`
+    and `get_all_positions(latest_only=True)` would, in one round trip.
+
+    The three queries share a single connection and read transaction, so the
+    results are mutually consistent and the connection setup is paid once.
+    """
+    orders_query = _orders_query(orders_start_date)
+    with read_connection() as conn, transaction(conn, immediate=False):
+        cash = _cash_row_to_dict(fetchone_query(_LATEST_CASH_SQL, conn=conn))
+        if orders_query is None:
+            orders = pd.DataFrame(columns=_ORDER_COLUMNS)
+        else:
+            query, params = orders_query
+            orders = df_from_query(query, params=params, parse_dates=["date"], conn=conn)
+        positions = df_from_query(_LATEST_POSITIONS_SQL, parse_dates=["date"], conn=conn)
+    return LatestSnapshot(
+        cash=cash, orders=_clean_tickers(orders), positions=_clean_tickers(positions)
+    )
+
+
+def _parse_date(s: str) -> datetime:
+    return datetime.strptime(s, "%Y-%m-%d")
+
+
+def _header_date(raw: bytes) -> Optional[str]:
+    """Return the YYYY-MM-DD date of a Markdown header line, if any."""
+    line = raw.strip()
+    if not line.startswith(b"#"):
+        return None
+    m = DATE_RE.search(line.decode("utf-8", errors="replace"))
+    return m.group(1) if m else None
 
 
 def get_latest_weekly_research(research_path: str = "ai_weekly_research.md") -> Dict[str, Any]:
@@ -147,76 +316,69 @@ def get_latest_weekly_research(research_path: str = "ai_weekly_research.md") ->
       - date: datetime (if parsed) or None
       - date_str: the YYYY-MM-DD string (if found) or ""
       - text: the concatenated text content (str)
+
+    Parsed results are memoized per (path, mtime), so repeat calls only cost
+    an `os.stat` until the file changes.
     """
     try:
-        with open(research_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+        mtime_ns = os.stat(research_path).st_mtime_ns
     except FileNotFoundError:
         return {"date": None, "date_str": "", "text": ""}
+    return dict(_read_latest_research(research_path, mtime_ns))
 
-    header_indices: List[Tuple[int, str]] = []  # (line_index, date_str)
-    date_pattern = re.compile(r"(\d{4}-\d{2}-\d{2})")
 
-    for idx, raw in enumerate(lines):
-        line = raw.strip()
-        if line.startswith("#"):
-            m = date_pattern.search(line)
-            if m:
-                header_indices.append((idx, m.group(1)))
-
-    if not header_indices:
+@lru_cache(maxsize=4)
+def _read_latest_research(research_path: str, mtime_ns: int) -> Dict[str, Any]:
+    # `mtime_ns` is only part of the cache key: a rewritten file misses the cache
+    latest_date_str = ""
+    offset = 0  # byte offset of the latest section body
+    content: List[bytes] = []
+    try:
+        # Binary mode keeps f.tell() usable while iterating. A single pass
+        # tracks the latest header (ISO dates sort lexicographically in
+        # calendar order; ties keep the first one) and only that section is
+        # read back.
+        with open(research_path, "rb") as f:
+            for raw in f:
+                date_str = _header_date(raw)
+                if date_str and date_str > latest_date_str:
+                    latest_date_str, offset = date_str, f.tell()
+
+            if not latest_date_str:
+                return {"date": None, "date_str": "", "text": ""}
+
+            # Content runs from the header until the next dated header or EOF
+            f.seek(offset)
+            for raw in f:
+                if _header_date(raw):
+                    break
+                content.append(raw)
+    except FileNotFoundError:
         return {"date": None, "date_str": "", "text": ""}
 
-    # Pick the header with the max date value
-    def parse_date(s: str) -> datetime:
-        return datetime.strptime(s, "%Y-%m-%d")
-
-    latest_idx, latest_date_str = max(
-        header_indices, key=lambda t: parse_date(t[1])
-    )
-
-    # Content is from next line after latest_idx until the next dated header or EOF
-    next_headers = [i for i, _ in header_indices if i > latest_idx]
-    end_idx = min(next_headers) if next_headers else len(lines)
-    content_lines = lines[latest_idx + 1 : end_idx]
-    text = "".join(content_lines).strip()
+    text = b"".join(content).decode("utf-8").replace("\r\n", "\n").strip()
 
     latest_date = None
     try:
-        latest_date = parse_date(latest_date_str)
+        latest_date = _parse_date(latest_date_str)
     except Exception:
         pass
 
     return {"date": latest_date, "date_str": latest_date_str, "text": text}
 
 
-def get_portfolio() -> Portfolio:
-    """Return the full positions dataset as a Portfolio instance."""
-    positions_df = get_all_positions()
+def get_portfolio(*, conn=None) -> Portfolio:
+    """Return the latest position per ticker as a Portfolio instance."""
+    positions_df = get_all_positions(latest_only=True, conn=conn)
     if positions_df.empty:
         return Portfolio.from_rows([])
 
-    records = positions_df.to_dict(orient="records")
-    positions: List[PortfolioPosition] = []
-    for row in records:
-        raw_date = row.get("date")
-        if pd.isna(raw_date):
-            parsed_date = None
-        else:
-            ts = pd.to_datetime(raw_date, errors="coerce")
-            parsed_date = ts.date() if not pd.isna(ts) else None
-
-        ticker = str(row.get("ticker", "")).strip().strip('"').strip("'")
-        qty = row.get("qty")
-        avg_price = row.get("avg_price")
-
-        positions.append(
-            PortfolioPosition(
-                date=parsed_date,
-                ticker=ticker,
-                qty=None if qty is None or pd.isna(qty) else float(qty),
-                avg_price=None if avg_price is None or pd.isna(avg_price) else float(avg_price),
-            )
-        )
-
-    return Portfolio.from_rows(positions)
+    # Normalize whole columns at once and hand them to the columnar constructor
+    dates = pd.to_datetime(positions_df["date"], errors="coerce")
+    dates = dates.dt.date.astype(object).where(dates.notna(), None)
+    return Portfolio.from_columns(
+        dates,
+        clean_ticker_series(positions_df["ticker"]),
+        pd.to_numeric(positions_df["qty"], errors="coerce").to_numpy(),
+        pd.to_numeric(positions_df["avg_price"], errors="coerce").to_numpy(),
+    )
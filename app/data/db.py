@@ -1,25 +1,256 @@
+import atexit
 import os
+import queue
 import sqlite3
-from typing import Iterable, Optional, Dict, Any
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Dict, Any
 
 import pandas as pd
 
 
 DB_PATH = os.getenv("DB_PATH", "db.sqlite3")
 
+# One long-lived connection per database path, shared by the whole process
+_CONNECTIONS: Dict[str, sqlite3.Connection] = {}
+_CONNECTIONS_LOCK = threading.Lock()
+
+# Read-only connections per database path, borrowed by `df_from_query` and
+# `fetchone_query` so reads do not queue behind the shared writer
+READ_POOL_SIZE = 4
+_READ_POOLS: Dict[str, "queue.Queue[sqlite3.Connection]"] = {}
+
+# Background `PRAGMA optimize` for long-running processes (the scheduler)
+OPTIMIZE_INTERVAL_SECONDS = 6 * 60 * 60
+_OPTIMIZER_STOP = threading.Event()
+_OPTIMIZER: Optional[threading.Thread] = None
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3 connection carrying the lock that serializes its transactions.
+
+    The shared writer is used from several threads (`asyncio.to_thread`
+    workers, the optimizer), so a transaction holds `tx_lock` until it ends;
+    only the owning thread can nest into it.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.tx_lock = threading.RLock()
+
+
+def _tx_lock(conn: sqlite3.Connection):
+    # Connections opened elsewhere carry no lock; they are not shared by us
+    return getattr(conn, "tx_lock", None) or nullcontext()
+
 
 def get_connection(path: Optional[str] = None) -> sqlite3.Connection:
-    """Return a sqlite3 connection with sensible defaults."""
+    """Return the shared sqlite3 connection for `path`, opening it on first use.
+
+    Opening also ensures the schema (see `bootstrap_db`), so callers can
+    assume the tables exist. The connection stays open for the life of the
+    process, so callers must not close it. It runs in autocommit mode; group
+    writes with `transaction()`.
+    """
+    db_path = path or DB_PATH
+    conn = _CONNECTIONS.get(db_path)
+    if conn is not None:
+        return conn
+    with _CONNECTIONS_LOCK:
+        conn = _CONNECTIONS.get(db_path)
+        if conn is None:
+            conn = _open_connection(db_path)
+            init_db(conn)
+            # 0x10002: check every table, not only those this connection has queried
+            conn.execute("PRAGMA optimize = 0x10002;")
+            _CONNECTIONS[db_path] = conn
+            _start_optimizer()
+    return conn
+
+
+def close_connection(path: Optional[str] = None) -> None:
+    """Optimize and close the shared connection for `path`, if one is open.
+
+    Pooled read-only connections for `path` are closed as well.
+    """
+    db_path = path or DB_PATH
+    with _CONNECTIONS_LOCK:
+        conn = _CONNECTIONS.pop(db_path, None)
+        pool = _READ_POOLS.pop(db_path, None)
+    if pool is not None:
+        _drain_read_pool(pool)
+    if conn is not None:
+        _optimize_and_close(conn)
+
+
+@contextmanager
+def read_connection(path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """Borrow a read-only (`mode=ro`, `query_only`) connection for `path`.
+
+    Up to `READ_POOL_SIZE` idle readers are kept for reuse; extra ones are
+    opened on demand and closed when returned. In-memory databases have no
+    file to share, so they fall back to the shared connection.
+    """
     db_path = path or DB_PATH
-    conn = sqlite3.connect(db_path)
+    if db_path == ":memory:":
+        yield get_connection(db_path)
+        return
+    pool = _read_pool(db_path)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _open_reader(db_path)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def _read_pool(db_path: str) -> "queue.Queue[sqlite3.Connection]":
+    pool = _READ_POOLS.get(db_path)
+    if pool is None:
+        with _CONNECTIONS_LOCK:
+            pool = _READ_POOLS.setdefault(db_path, queue.Queue(maxsize=READ_POOL_SIZE))
+    return pool
+
+
+def _open_reader(db_path: str) -> sqlite3.Connection:
+    # The writer creates the file, schema and WAL files a reader relies on
+    get_connection(db_path)
+    uri = Path(db_path).absolute().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(
+        uri, uri=True, check_same_thread=False, isolation_level=None, factory=_Connection
+    )
+    _apply_pragmas(conn)
+    conn.execute("PRAGMA query_only = 1;")
+    return conn
+
+
+def _drain_read_pool(pool: "queue.Queue[sqlite3.Connection]") -> None:
+    while True:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            return
+
+
+@contextmanager
+def transaction(
+    conn: Optional[sqlite3.Connection] = None, *, immediate: bool = True
+) -> Iterator[sqlite3.Connection]:
+    """Run the block in one explicit transaction, committed once on success.
+
+    `BEGIN IMMEDIATE` takes the write lock up front so a write batch cannot
+    fail halfway on a busy database; pass `immediate=False` for read-only
+    snapshots. Nested use on the same thread joins the transaction already
+    open on `conn`; other threads wait for it to finish (see `_Connection`).
+    """
+    if conn is None:
+        conn = get_connection()
+    with _tx_lock(conn):
+        # Under the lock an open transaction can only be this thread's own
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            # Some errors already roll the transaction back inside SQLite
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def optimize_db(path: Optional[str] = None) -> None:
+    """Run `PRAGMA optimize`, refreshing planner statistics that went stale."""
+    conn = get_connection(path)
+    with _tx_lock(conn):
+        conn.execute("PRAGMA optimize;")
+
+
+def _optimize_and_close(conn: sqlite3.Connection) -> None:
+    try:
+        with _tx_lock(conn):
+            conn.execute("PRAGMA optimize;")
+    except sqlite3.Error as exc:
+        print(f"[db] PRAGMA optimize failed: {exc}")
+    finally:
+        conn.close()
+
+
+def _start_optimizer() -> None:
+    # Called with _CONNECTIONS_LOCK held
+    global _OPTIMIZER
+    if _OPTIMIZER is None:
+        _OPTIMIZER = threading.Thread(
+            target=_optimize_periodically, name="sqlite-optimize", daemon=True
+        )
+        _OPTIMIZER.start()
+
+
+def _optimize_periodically() -> None:
+    while not _OPTIMIZER_STOP.wait(OPTIMIZE_INTERVAL_SECONDS):
+        with _CONNECTIONS_LOCK:
+            conns = list(_CONNECTIONS.values())
+        for conn in conns:
+            try:
+                # Outside any other thread's transaction
+                with _tx_lock(conn):
+                    conn.execute("PRAGMA optimize;")
+            except sqlite3.Error as exc:
+                print(f"[db] PRAGMA optimize failed: {exc}")
+
+
+@atexit.register
+def _close_all_connections() -> None:
+    _OPTIMIZER_STOP.set()
+    with _CONNECTIONS_LOCK:
+        conns = list(_CONNECTIONS.values())
+        _CONNECTIONS.clear()
+        pools = list(_READ_POOLS.values())
+        _READ_POOLS.clear()
+    for pool in pools:
+        _drain_read_pool(pool)
+    for conn in conns:
+        _optimize_and_close(conn)
+
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    """Open a sqlite3 connection with sensible defaults."""
+    # Shared across threads; sqlite serializes access to the handle itself and
+    # `transaction()` serializes transactions through `_Connection.tx_lock`
+    # isolation_level=None: no implicit BEGIN; `transaction()` owns the boundaries
+    conn = sqlite3.connect(
+        db_path, check_same_thread=False, isolation_level=None, factory=_Connection
+    )
+    _apply_pragmas(conn)
+    return conn
+
+
+def _apply_pragmas(conn: sqlite3.Connection) -> None:
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+    # WAL (enabled in init_db) keeps commits durable with NORMAL sync
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    # Keep hot pages in memory: 256 MiB memory-mapped I/O, ~64 MiB page cache
+    conn.execute("PRAGMA mmap_size = 268435456;")
+    conn.execute("PRAGMA cache_size = -64000;")
+    conn.execute("PRAGMA temp_store = MEMORY;")
 
 
 def init_db(conn: sqlite3.Connection) -> None:
     """Create tables if they do not exist."""
     cur = conn.cursor()
+    # Persistent for the database file; lets readers run alongside a writer
+    cur.execute("PRAGMA journal_mode = WAL;")
     # Cash snapshots (one row per date)
     cur.execute(
         """
@@ -42,6 +273,31 @@ def init_db(conn: sqlite3.Connection) -> None:
         );
         """
     )
+    # Serves the per-ticker "latest date" lookup in get_all_positions
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_positions_ticker_date ON positions(ticker, date);"
+    )
+    # One row per ticker, which the upsert in sync_positions_with_portfolio
+    # relies on. Older databases may still hold history rows: keep the latest
+    # date per ticker (latest rowid on ties) before adding the constraint.
+    has_unique_ticker = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_positions_ticker';"
+    ).fetchone()
+    if has_unique_ticker is None:
+        cur.execute(
+            """
+            DELETE FROM positions
+            WHERE EXISTS (
+                SELECT 1 FROM positions AS newer
+                WHERE newer.ticker = positions.ticker
+                  AND (
+                      newer.date > positions.date
+                      OR (newer.date = positions.date AND newer.rowid > positions.rowid)
+                  )
+            );
+            """
+        )
+        cur.execute("CREATE UNIQUE INDEX idx_positions_ticker ON positions(ticker);")
     # Executed orders (can have multiple per date/ticker)
     cur.execute(
         """
@@ -54,6 +310,13 @@ def init_db(conn: sqlite3.Connection) -> None:
         );
         """
     )
+    # Serves the date lookups in get_latest_orders (and per-day ticker
+    # filters). cash(date) and positions(date, ticker) are already covered by
+    # their key constraints. Supersedes the earlier single-column index.
+    cur.execute("DROP INDEX IF EXISTS idx_orders_date;")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_orders_date_ticker ON orders(date, ticker);"
+    )
     # Market daily info per ticker (one row per date/ticker)
     cur.execute(
         """
@@ -71,30 +334,70 @@ def init_db(conn: sqlite3.Connection) -> None:
         );
         """
     )
+    # Per-ticker time series; the primary key only serves date-first lookups
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_stocks_info_ticker_date ON stocks_info(ticker, date);"
+    )
     conn.commit()
 
 
 def table_is_empty(conn: sqlite3.Connection, table: str) -> bool:
+    """Return True when `table` does not exist or has no rows."""
     try:
-        cur = conn.execute(f"SELECT 1 FROM {table} LIMIT 1")
-        return cur.fetchone() is None
+        # Parameterized catalog lookup first, so a missing table costs no
+        # failed prepare and the statement stays cached across calls
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if exists is None:
+            return True
+        # Identifiers cannot be bound; quote the (now known) table name
+        quoted = '"' + table.replace('"', '""') + '"'
+        return not conn.execute(f"SELECT EXISTS(SELECT 1 FROM {quoted})").fetchone()[0]
     except sqlite3.Error:
         return True
 
 
 def bootstrap_db(path: Optional[str] = None) -> None:
-    """Ensure the SQLite database exists with the expected schema."""
-    conn = get_connection(path)
-    try:
-        init_db(conn)
-    finally:
-        conn.close()
+    """Ensure the SQLite database exists with the expected schema.
 
+    The schema is created when the shared connection is first opened, so this
+    is only needed by startup code that wants to fail fast; later calls return
+    immediately.
+    """
+    get_connection(path)
 
-def df_from_query(sql: str, params: Iterable[Any] | None = None) -> pd.DataFrame:
-    conn = get_connection()
-    try:
-        df = pd.read_sql_query(sql, conn, params=params or [])
-        return df
-    finally:
-        conn.close()
+
+def df_from_query(
+    sql: str,
+    params: Iterable[Any] | None = None,
+    parse_dates: Optional[list[str]] = None,
+    conn: Optional[sqlite3.Connection] = None,
+) -> pd.DataFrame:
+    """Run a query and return the rows as a DataFrame.
+
+    Columns named in `parse_dates` are decoded to datetimes while the frame is
+    built (unparseable values become NaT), so callers need no extra
+    `pd.to_datetime` pass. Runs on `conn` when given, otherwise on a pooled
+    read-only connection (see `read_connection`).
+    """
+    if conn is None:
+        with read_connection() as reader:
+            return df_from_query(sql, params, parse_dates, conn=reader)
+    return pd.read_sql_query(sql, conn, params=params or [], parse_dates=parse_dates)
+
+
+def fetchone_query(
+    sql: str,
+    params: Iterable[Any] | None = None,
+    conn: Optional[sqlite3.Connection] = None,
+) -> Optional[sqlite3.Row]:
+    """Run a query and return its first row, or None when there is none.
+
+    Cheaper than `df_from_query` for single-row lookups: no DataFrame is built.
+    Accepts an existing `conn` like `df_from_query`.
+    """
+    if conn is None:
+        with read_connection() as reader:
+            return fetchone_query(sql, params, conn=reader)
+    return conn.execute(sql, list(params or [])).fetchone()
@@ -1,13 +1,53 @@
-import math
-from typing import Any, Dict, List, Optional, Sequence
+import json
+import sqlite3
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Optional, Sequence
 
 import pandas as pd
-from data.db import bootstrap_db, get_connection
+from app.data._common import clean_ticker
+from app.data.db import get_connection, transaction
 
 from domain.models import Order
 from portfolio_manager import Portfolio, CashSnapshot
 
+# Rows per executemany call in `insert_new_orders_batch`
+ORDER_INSERT_CHUNK_SIZE = 10_000
+
+# yfinance column -> stocks_info column, in insert order
+_DAILY_COLUMNS = {
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+    "Volume": "volume",
+    "Dividends": "dividends",
+    "Stock Splits": "stock_splits",
+}
+
+
+def _utc_today_str() -> str:
+    # stdlib clock: no pandas Timestamp needed for today's UTC calendar day
+    return datetime.now(timezone.utc).date().isoformat()
+
+
 def _to_date_str(ts) -> str:
+    # Batches usually share one session date, so parse each value only once.
+    # The tz is part of the key: equal instants in different zones can fall
+    # on different calendar days.
+    try:
+        return _cached_date_str(ts, getattr(ts, "tzinfo", None))
+    except TypeError:  # unhashable input
+        return _format_date_str(ts)
+
+
+@lru_cache(maxsize=4096)
+def _cached_date_str(ts, _tz) -> str:
+    return _format_date_str(ts)
+
+
+def _format_date_str(ts) -> str:
     ts = pd.to_datetime(ts)
     # Keep calendar day; ignore timezone for formatting
     return ts.date().strftime("%Y-%m-%d")
@@ -33,42 +73,38 @@ def insert_latest_daily_data(
     if len(daily_data) != len(tickers):
         raise ValueError("daily_data and tickers must have the same length")
 
-    records = []
-    for tkr, df in zip(tickers, daily_data):
-        if df is None or df.empty:
-            continue
-        # Take most recent row
-        last_idx = df.index[-1]
-        row = df.iloc[-1]
-        record = {
-            "date": _to_date_str(last_idx),
-            "ticker": str(tkr).strip().strip('"').strip("'"),
-            "open": float(row.get("Open")),
-            "high": float(row.get("High")),
-            "low": float(row.get("Low")),
-            "close": float(row.get("Close")),
-            "volume": int(row.get("Volume")),
-        }
-        # If dividends/splits are present, include them; otherwise they'll be omitted
-        if "Dividends" in row.index:
-            record["dividends"] = float(row.get("Dividends", 0.0))
-        if "Stock Splits" in row.index:
-            record["stock_splits"] = float(row.get("Stock Splits", 0.0))
-        records.append(record)
-
-    if not records:
+    frames = [
+        (clean_ticker(str(tkr)), df)
+        for tkr, df in zip(tickers, daily_data)
+        if df is not None and not df.empty
+    ]
+    if not frames:
         return 0
 
+    # Stack the most recent row of every frame and normalize columns at once
+    latest = (
+        pd.concat([df.tail(1) for _, df in frames], ignore_index=True)
+        .reindex(columns=list(_DAILY_COLUMNS))
+        .rename(columns=_DAILY_COLUMNS)
+        .astype({"open": float, "high": float, "low": float, "close": float, "volume": "int64"})
+    )
+    # Missing dividends/splits bind as NULL so the upsert keeps stored values
+    for col in ("dividends", "stock_splits"):
+        values = latest[col].astype(float)
+        latest[col] = values.astype(object).where(values.notna(), None)
+    # Dates come from each frame's own index so its timezone keeps the calendar day
+    latest.insert(0, "date", [_to_date_str(df.index[-1]) for _, df in frames])
+    latest.insert(1, "ticker", [ticker for ticker, _ in frames])
+
     # Insert records into SQLite with upsert semantics
-    bootstrap_db()
     conn = get_connection()
-    try:
+    with transaction(conn):
         cur = conn.cursor()
         cur.executemany(
             """
             INSERT INTO stocks_info(
                 date, ticker, open, high, low, close, volume, dividends, stock_splits
-            ) VALUES (:date, :ticker, :open, :high, :low, :close, :volume, :dividends, :stock_splits)
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(date, ticker) DO UPDATE SET
                 open=excluded.open,
                 high=excluded.high,
@@ -78,12 +114,9 @@ def insert_latest_daily_data(
                 dividends=COALESCE(excluded.dividends, stocks_info.dividends),
                 stock_splits=COALESCE(excluded.stock_splits, stocks_info.stock_splits)
             """,
-            records,
+            latest.itertuples(index=False, name=None),
         )
-        conn.commit()
-    finally:
-        conn.close()
-    return len(records)
+    return len(latest)
 
 
 def insert_new_order(order: Order):
@@ -93,50 +126,64 @@ def insert_new_order(order: Order):
 
     Returns the inserted row id.
     """
-    if order is None:
-        raise ValueError("order must not be None")
-
-    # Normalize fields
-    ticker = str(order.ticker).strip().strip('"').strip("'")
-    if not ticker:
-        raise ValueError("order.ticker must be a non-empty string")
-
-    qty = int(order.qty)
-    price = float(order.price)
-
-    # Use current date (ignore time component)
-    date_str = _to_date_str(pd.Timestamp.utcnow())
+    row = _order_row(order, _utc_today_str())
 
     # Insert into SQLite
-    bootstrap_db()
     conn = get_connection()
-    try:
+    with transaction(conn):
         cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO orders(date, ticker, qty, price) VALUES (?, ?, ?, ?)",
-            (date_str, ticker, qty, price),
-        )
-        conn.commit()
+        cur.execute(_INSERT_ORDER_SQL, row)
         return cur.lastrowid
-    finally:
-        conn.close()
 
 
-def _float_equal(a: Optional[float], b: Optional[float], *, tol: float = 1e-9) -> bool:
-    if a is None and b is None:
-        return True
-    if a is None or b is None:
-        return False
-    try:
-        return math.isclose(float(a), float(b), rel_tol=tol, abs_tol=tol)
-    except (TypeError, ValueError):
-        return False
+def insert_new_orders_batch(
+    orders: Iterable[Order], *, conn: Optional[sqlite3.Connection] = None
+) -> int:
+    """Append executed orders into SQLite `orders` in one transaction.
+
+    `orders` is consumed once and written in `executemany` chunks of
+    `ORDER_INSERT_CHUNK_SIZE`, so a generator never has to be materialized.
+    A bad order raises and rolls the whole batch back. Dated like
+    `insert_new_order`. Pass `conn` to join a transaction already open on it.
+
+    Returns the number of inserted rows.
+    """
+    date_str = _utc_today_str()
+    rows = (_order_row(order, date_str) for order in orders or ())
+    chunk = list(islice(rows, ORDER_INSERT_CHUNK_SIZE))
+    if not chunk:
+        return 0
+
+    inserted = 0
+    conn = conn or get_connection()
+    with transaction(conn):
+        while chunk:
+            conn.executemany(_INSERT_ORDER_SQL, chunk)
+            inserted += len(chunk)
+            chunk = list(islice(rows, ORDER_INSERT_CHUNK_SIZE))
+    return inserted
+
+
+_INSERT_ORDER_SQL = "INSERT INTO orders(date, ticker, qty, price) VALUES (?, ?, ?, ?)"
+
+
+def _order_row(order: Order, date_str: str) -> tuple:
+    if order is None:
+        raise ValueError("order must not be None")
+
+    # Normalize fields
+    ticker = clean_ticker(str(order.ticker))
+    if not ticker:
+        raise ValueError("order.ticker must be a non-empty string")
+
+    return (date_str, ticker, int(order.qty), float(order.price))
 
 
 def sync_positions_with_portfolio(
     portfolio: Portfolio,
     *,
     as_of: Optional[Any] = None,
+    conn: Optional[sqlite3.Connection] = None,
 ) -> Dict[str, int]:
     """Sync the SQLite `positions` table with the provided portfolio snapshot.
 
@@ -145,129 +192,72 @@ def sync_positions_with_portfolio(
         as_of: Optional date override (str/date/datetime). Used when writing new or
             changed rows. Defaults to UTC now if not provided and the position
             instance lacks a date.
+        conn: Optional connection; an open transaction on it is joined.
 
     Returns:
         Dict with counts of inserted, updated, and deleted rows.
     """
 
-    default_date_str = _to_date_str(as_of or pd.Timestamp.utcnow())
+    default_date_str = _to_date_str(as_of) if as_of else _utc_today_str()
 
-    bootstrap_db()
-    conn = get_connection()
-    inserted = updated = deleted = 0
-
-    try:
+    # Compute target rows keyed by ticker.
+    target_rows: Dict[str, tuple] = {}
+    for position in portfolio.positions:
+        ticker = str(position.ticker)
+        if not ticker:
+            continue
+        qty = None if position.qty is None else float(position.qty)
+        avg_price = None if position.avg_price is None else float(position.avg_price)
+        if position.date is not None:
+            desired_date = _to_date_str(position.date)
+        else:
+            desired_date = default_date_str
+        target_rows[ticker] = (desired_date, ticker, qty, avg_price)
+
+    conn = conn or get_connection()
+    with transaction(conn):
         cur = conn.cursor()
-
-        # Load existing rows keyed by ticker, keeping the most recent entry.
-        rows = cur.execute(
-            "SELECT rowid as rowid, date, ticker, qty, avg_price FROM positions"
-        ).fetchall()
-
-        existing_by_ticker: Dict[str, Dict[str, Any]] = {}
-        duplicate_rowids: List[int] = []
-
-        for row in rows:
-            ticker = str(row["ticker"])
-            if not ticker:
-                continue
-
-            current = existing_by_ticker.get(ticker)
-            current_date = row["date"] or ""
-
-            if current is None:
-                existing_by_ticker[ticker] = {
-                    "rowid": row["rowid"],
-                    "date": row["date"],
-                    "qty": row["qty"],
-                    "avg_price": row["avg_price"],
-                }
-                continue
-
-            stored_date = current["date"] or ""
-
-            if current_date > stored_date or (
-                current_date == stored_date and row["rowid"] > current["rowid"]
-            ):
-                duplicate_rowids.append(current["rowid"])
-                existing_by_ticker[ticker] = {
-                    "rowid": row["rowid"],
-                    "date": row["date"],
-                    "qty": row["qty"],
-                    "avg_price": row["avg_price"],
-                }
-            else:
-                duplicate_rowids.append(row["rowid"])
-
-        # Remove duplicates so only one row per ticker remains.
-        for rowid in duplicate_rowids:
-            cur.execute("DELETE FROM positions WHERE rowid = ?", (rowid,))
-            deleted += cur.rowcount
-
-        # Compute target positions keyed by ticker.
-        target_positions: Dict[str, Any] = {}
-        for position in portfolio.positions:
-            ticker = str(position.ticker)
-            if not ticker:
-                continue
-            target_positions[ticker] = position
-
-        existing_tickers = set(existing_by_ticker.keys())
-        target_tickers = set(target_positions.keys())
+        # Only the ticker set is read, to tell inserts from updates in the counts
+        cur.row_factory = None
+        existing_tickers = {row[0] for row in cur.execute("SELECT ticker FROM positions")}
 
         # Remove tickers no longer present in the portfolio.
-        for ticker in existing_tickers - target_tickers:
-            cur.execute("DELETE FROM positions WHERE ticker = ?", (ticker,))
-            deleted += cur.rowcount
-            existing_by_ticker.pop(ticker, None)
-
-        # Upsert the remaining tickers.
-        for ticker, position in target_positions.items():
-            qty = None if position.qty is None else float(position.qty)
-            avg_price = (
-                None if position.avg_price is None else float(position.avg_price)
-            )
-
-            if position.date is not None:
-                desired_date = _to_date_str(position.date)
-            else:
-                desired_date = default_date_str
-
-            existing = existing_by_ticker.get(ticker)
-
-            if existing is None:
-                cur.execute(
-                    "INSERT INTO positions(date, ticker, qty, avg_price) VALUES (?, ?, ?, ?)",
-                    (desired_date, ticker, qty, avg_price),
-                )
-                inserted += 1
-                continue
-
-            same_qty = _float_equal(existing["qty"], qty)
-            same_avg = _float_equal(existing["avg_price"], avg_price)
-            same_date = (existing["date"] or "") == desired_date
-
-            if same_qty and same_avg and same_date:
-                continue
-
-            cur.execute(
-                "UPDATE positions SET date = ?, qty = ?, avg_price = ? WHERE rowid = ?",
-                (desired_date, qty, avg_price, existing["rowid"]),
+        cur.execute(
+            "DELETE FROM positions WHERE ticker NOT IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(target_rows)),),
+        )
+        deleted = cur.rowcount
+
+        # Upsert the remaining tickers; unchanged rows are left untouched.
+        changed = 0
+        if target_rows:
+            cur.executemany(
+                """
+                INSERT INTO positions(date, ticker, qty, avg_price) VALUES (?, ?, ?, ?)
+                ON CONFLICT(ticker) DO UPDATE SET
+                    date = excluded.date,
+                    qty = excluded.qty,
+                    avg_price = excluded.avg_price
+                WHERE positions.date IS NOT excluded.date
+                   OR positions.qty IS NOT excluded.qty
+                   OR positions.avg_price IS NOT excluded.avg_price
+                """,
+                target_rows.values(),
             )
-            updated += cur.rowcount
+            changed = cur.rowcount
 
-        conn.commit()
-    finally:
-        conn.close()
+    inserted = len(target_rows.keys() - existing_tickers)
+    return {"inserted": inserted, "updated": changed - inserted, "deleted": deleted}
 
-    return {"inserted": inserted, "updated": updated, "deleted": deleted}
 
-
-def insert_cash_snapshot(snapshot: CashSnapshot) -> None:
+def insert_cash_snapshot(
+    snapshot: CashSnapshot, *, conn: Optional[sqlite3.Connection] = None
+) -> None:
     """Insert or replace a cash snapshot row in SQLite `cash`.
 
     This function performs no business logic: it simply writes the provided
     snapshot (date, amount, total_portfolio_amount) using upsert semantics.
+    Pass `conn` to join a transaction already open on it.
     """
     if snapshot is None:
         raise ValueError("snapshot must not be None")
@@ -275,9 +265,8 @@ def insert_cash_snapshot(snapshot: CashSnapshot) -> None:
     if snapshot.date is None:
         raise ValueError("snapshot.date must not be None")
 
-    bootstrap_db()
-    conn = get_connection()
-    try:
+    conn = conn or get_connection()
+    with transaction(conn):
         # Normalize date to yyyy-mm-dd
         date_str = _to_date_str(snapshot.date)
         amount = float(snapshot.amount)
@@ -297,6 +286,3 @@ def insert_cash_snapshot(snapshot: CashSnapshot) -> None:
             """,
             (date_str, amount, total),
         )
-        conn.commit()
-    finally:
-        conn.close()
@@ -2,21 +2,31 @@
 
 from __future__ import annotations
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+
+# Immutable value objects; unknown fields from model output are dropped
+_MODEL_CONFIG = ConfigDict(frozen=True, extra="ignore", validate_assignment=False)
 
 
 class Order(BaseModel):
+    model_config = _MODEL_CONFIG
+
     ticker: str
     qty: int
     price: float = Field(..., ge=0.0)
 
 
 class AiDecision(BaseModel):
+    model_config = _MODEL_CONFIG
+
     daily_summary: str
     orders: list[Order]
     explanation: str
 
 
 class WeeklyResearch(BaseModel):
+    model_config = _MODEL_CONFIG
+
     research: str
     orders: list[Order]
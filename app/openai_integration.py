@@ -1,47 +1,130 @@
 import argparse
-import json
+import asyncio
+import atexit
+import hashlib
+import importlib.util
+import logging
 import os
+import random
 import re
-from typing import Optional
-from datetime import datetime
-
-from agents import Agent, Runner, WebSearchTool
-from agents.models import _openai_shared as _agents_openai_shared
+import threading
+import time
+from functools import cache, lru_cache
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
 
 from domain.models import AiDecision, Order, WeeklyResearch
 
-try:
-    from dotenv import load_dotenv
-except Exception:  # pragma: no cover - optional dependency
-    load_dotenv = None
-
-try:  # pragma: no cover - optional dependency
-    import httpx
-except Exception:  # pragma: no cover - optional dependency
-    httpx = None
-
-try:  # pragma: no cover - optional dependency
-    from openai import AsyncOpenAI
-except Exception:  # pragma: no cover - optional dependency
-    AsyncOpenAI = None
+logger = logging.getLogger(__name__)
+# Blue monotonic timestamp (ns) followed by the stream event type
+_EVENT_LOG_FORMAT = "\033[94m%d\033[0m %s"
 
-if load_dotenv is not None:
-    load_dotenv()  # nosec: loads .env into process env if present
-DEFAULT_DAILY_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-DEFAULT_RESEARCH_MODEL = os.getenv(
-    "OPENAI_RESEARCH_MODEL", "o4-mini-deep-research-2025-06-26"
-)
+# Fallback model names; the OPENAI_MODEL / OPENAI_RESEARCH_MODEL env vars are
+# resolved per call, after `.env` has been loaded
+DEFAULT_DAILY_MODEL = "gpt-4o-mini"
+DEFAULT_RESEARCH_MODEL = "o4-mini-deep-research-2025-06-26"
 DEFAULT_TIMEOUT_SECONDS = 120.0
 DEFAULT_DEEP_TIMEOUT_SECONDS = 1800.0
-JSON_FENCE_PATTERN = re.compile(r"```(?:json)?\s*([\s\S]*?)```", re.IGNORECASE)
+JSON_FENCE = b"```"
+# Bytes that can change brace depth or string state in `_find_json_span`
+_JSON_SCAN_TOKENS = re.compile(rb'[{}"\\]')
+
+# Long-lived HTTP/OpenAI clients, memoized by `_build_openai_client` so later
+# calls reuse pooled keep-alive connections instead of new handshakes
+HTTP_MAX_CONNECTIONS = 32
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 16
+# Long enough to carry a warm connection across a whole research stream
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 300.0
+HTTP_CONNECT_TIMEOUT_SECONDS = 10.0
+HTTP_POOL_TIMEOUT_SECONDS = 5.0
+# Retries are done by `_run_with_backoff` (the SDK client's own are disabled):
+# exponential from RETRY_BASE_DELAY_SECONDS, capped, plus up to RETRY_JITTER_SECONDS
+RETRY_BASE_DELAY_SECONDS = 0.25
+RETRY_MAX_DELAY_SECONDS = 8.0
+RETRY_JITTER_SECONDS = 0.25
+# Same statuses the openai client retries by default
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+# (http_client, client) pairs built by this module, closed on shutdown
+_OWNED_CLIENTS: list[tuple] = []
+_CLIENT_LOCK = threading.Lock()
+
+# (model, prompt digest) -> result future of the deep research run in flight
+_INFLIGHT_RESEARCH: dict[tuple[str, str], asyncio.Future] = {}
+
+
+class _Sdk(NamedTuple):
+    Agent: Any
+    Runner: Any
+    WebSearchTool: Any
+    openai_shared: Any
+    AsyncOpenAI: Any  # None when openai is missing
+    DefaultAioHttpClient: Any  # None before openai 1.93
+    httpx: Any  # None when httpx is missing
+    openai: Any  # None when openai is missing
+
+
+@cache
+def _import_sdk() -> _Sdk:
+    """Import the Agents SDK and HTTP stack on first use.
+
+    Their import graph costs hundreds of milliseconds, which CLI runs that
+    fail early (or never call the API) should not pay.
+    """
+    from agents import Agent, Runner, WebSearchTool
+    from agents.models import _openai_shared
+
+    try:  # pragma: no cover - optional dependency
+        import httpx
+    except Exception:  # pragma: no cover - optional dependency
+        httpx = None
+
+    try:  # pragma: no cover - optional dependency
+        import openai
+        from openai import AsyncOpenAI
+    except Exception:  # pragma: no cover - optional dependency
+        openai = None
+        AsyncOpenAI = None
+
+    try:  # pragma: no cover - optional dependency (openai>=1.93)
+        from openai import DefaultAioHttpClient
+    except Exception:  # pragma: no cover - optional dependency
+        DefaultAioHttpClient = None
+
+    return _Sdk(
+        Agent=Agent,
+        Runner=Runner,
+        WebSearchTool=WebSearchTool,
+        openai_shared=_openai_shared,
+        AsyncOpenAI=AsyncOpenAI,
+        DefaultAioHttpClient=DefaultAioHttpClient,
+        httpx=httpx,
+        openai=openai,
+    )
 
 
 def send_prompt(prompt: str, *, model: Optional[str] = None) -> AiDecision:
+    """Blocking wrapper around `send_prompt_async` for sync callers.
+
+    Starts its own event loop on each call, so it must not be called from
+    async code; await `send_prompt_async` there instead. The pooled client is
+    bound to that loop, so it is closed before the loop ends and the next call
+    builds a new one.
+    """
+
+    async def _run() -> AiDecision:
+        try:
+            return await send_prompt_async(prompt, model=model)
+        finally:
+            await aclose_openai_client()
+
+    return asyncio.run(_run())
+
+
+async def send_prompt_async(prompt: str, *, model: Optional[str] = None) -> AiDecision:
     """Send a prompt through a freshly created OpenAI Agent and return its reply.
 
     Args:
         prompt: The user prompt to send.
-        model: Model name, defaults to env `OPENAI_MODEL` or `gpt-5-mini-2025-08-07`.
+        model: Model name, defaults to env `OPENAI_MODEL` or `gpt-4o-mini`.
 
     Env Vars:
         OPENAI_API_KEY (required)
@@ -50,15 +133,48 @@ def send_prompt(prompt: str, *, model: Optional[str] = None) -> AiDecision:
 
     _ensure_api_key()
 
-    model_name = model or DEFAULT_DAILY_MODEL
+    sdk = _import_sdk()
+    model_name = model or os.getenv("OPENAI_MODEL", DEFAULT_DAILY_MODEL)
     _configure_openai_client(default_timeout_s=DEFAULT_TIMEOUT_SECONDS)
 
-    agent = Agent(name="Assistant", model=model_name, output_type=AiDecision)
+    agent = sdk.Agent(name="Assistant", model=model_name, output_type=AiDecision)
 
-    result = Runner.run_sync(agent, prompt)
+    result = await _run_with_backoff(lambda: sdk.Runner.run(agent, prompt))
     return result.final_output
 
 
+async def send_prompts_async(
+    prompts: list[str],
+    *,
+    model: Optional[str] = None,
+    max_concurrency: int = 8,
+) -> list[AiDecision]:
+    """Send several prompts concurrently through one shared OpenAI Agent.
+
+    At most `max_concurrency` runs are in flight at once; all of them share the
+    cached client and its connection pool. Results keep the order of `prompts`.
+    """
+
+    if not prompts:
+        return []
+
+    _ensure_api_key()
+
+    sdk = _import_sdk()
+    model_name = model or os.getenv("OPENAI_MODEL", DEFAULT_DAILY_MODEL)
+    _configure_openai_client(default_timeout_s=DEFAULT_TIMEOUT_SECONDS)
+
+    agent = sdk.Agent(name="Assistant", model=model_name, output_type=AiDecision)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _one(prompt: str) -> AiDecision:
+        async with semaphore:
+            result = await _run_with_backoff(lambda: sdk.Runner.run(agent, prompt))
+        return result.final_output
+
+    return list(await asyncio.gather(*(_one(p) for p in prompts)))
+
+
 async def deep_research_async(
     prompt: str,
     *,
@@ -85,47 +201,139 @@ async def deep_research_async(
             if mock_payload is None:
                 return _default_weekly_research_mock()
             if isinstance(mock_payload, str):
-                payload = json.loads(mock_payload)
-            else:
-                payload = mock_payload
-            return WeeklyResearch.model_validate(payload)
+                # Parse and validate in one pydantic-core pass
+                return _validate_weekly_research_json(mock_payload)
+            return WeeklyResearch.model_validate(mock_payload)
         except Exception:
             # Fallback to the baked-in mock if custom payload fails
             return _default_weekly_research_mock()
 
     _ensure_api_key()
 
-    model_name = model or DEFAULT_RESEARCH_MODEL
-    _configure_openai_client(default_timeout_s=DEFAULT_DEEP_TIMEOUT_SECONDS)
+    model_name = model or os.getenv("OPENAI_RESEARCH_MODEL", DEFAULT_RESEARCH_MODEL)
 
-    instructions = (
-        "Conduza um deep research completo, fundamentado e acionável sobre o contexto fornecido. "
-        "Use a ferramenta de busca quando necessário para verificar fatos e enriquecer a análise. "
-        "Não faça perguntas ao usuário; formule hipóteses e valide-as. "
-        "Sua saída deve ser estruturada e diretamente aplicável à carteira. "
-        "Retorne um JSON estrito com o seguinte formato sem cercas de código: "
-        '{"research": string, "orders": [{"ticker": string, "qty": integer, "price": number}]}. '
-        'Se não houver ordens, use uma lista vazia em "orders".'
-    )
+    # Identical concurrent requests share one agent run instead of paying for
+    # a second, possibly 30-minute, research session
+    loop = asyncio.get_running_loop()
+    key = (model_name, hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest())
+    pending = _INFLIGHT_RESEARCH.get(key)
+    if pending is not None and pending.get_loop() is loop:
+        # shield: a cancelled follower must not cancel the shared result
+        return await asyncio.shield(pending)
 
-    agent = Agent(
+    future: asyncio.Future = loop.create_future()
+    _INFLIGHT_RESEARCH[key] = future
+    try:
+        result = await _run_with_backoff(
+            lambda: _run_deep_research(prompt, model_name)
+        )
+    except BaseException as exc:
+        if isinstance(exc, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(exc)
+            future.exception()  # the caller re-raises it; don't log it twice
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        if _INFLIGHT_RESEARCH.get(key) is future:
+            del _INFLIGHT_RESEARCH[key]
+
+
+# Agent instructions for `deep_research_async`; built once at import
+_DEEP_RESEARCH_INSTRUCTIONS = (
+    "Conduza um deep research completo, fundamentado e acionável sobre o contexto fornecido. "
+    "Use a ferramenta de busca quando necessário para verificar fatos e enriquecer a análise. "
+    "Não faça perguntas ao usuário; formule hipóteses e valide-as. "
+    "Sua saída deve ser estruturada e diretamente aplicável à carteira. "
+    "Retorne um JSON estrito com o seguinte formato sem cercas de código: "
+    '{"research": string, "orders": [{"ticker": string, "qty": integer, "price": number}]}. '
+    'Se não houver ordens, use uma lista vazia em "orders".'
+)
+
+
+async def _run_deep_research(prompt: str, model_name: str) -> WeeklyResearch:
+    sdk = _import_sdk()
+    _configure_openai_client(default_timeout_s=DEFAULT_DEEP_TIMEOUT_SECONDS)
+
+    agent = sdk.Agent(
         name="Assistant",
         model=model_name,
-        tools=[WebSearchTool()],
-        instructions=instructions,
+        tools=[sdk.WebSearchTool()],
+        instructions=_DEEP_RESEARCH_INSTRUCTIONS,
     )
 
-    stream = Runner.run_streamed(agent, prompt)
+    stream = sdk.Runner.run_streamed(agent, prompt)
 
+    # Streams emit many events; only format them when debug logging is on
+    debug_events = logger.isEnabledFor(logging.DEBUG)
     async for ev in stream.stream_events():
-        print(f"\033[94m{datetime.now()} \033[0m {ev.type}")
+        if debug_events:
+            logger.debug(_EVENT_LOG_FORMAT, time.monotonic_ns(), ev.type)
+        if ev.type != "run_item_stream_event" or ev.name != "tool_called":
+            continue
+        # Web search calls carry an `action`; other tool calls do not
+        try:
+            action = ev.item.raw_item.action
+            formatter = _ACTION_FORMATTERS.get(action.type)
+        except AttributeError:
+            continue
+        if formatter is not None:
+            print(f"[deep_research] {formatter(action)}")
 
     result = stream.final_output
+    # Multi-KB payload: only materialize it when debugging
+    logger.debug("research result: %r", result)
+
+    return _coerce_weekly_research(result)
 
-    print(result)
 
-    raw_text = result if isinstance(result, str) else str(result)
-    return _parse_weekly_research(raw_text)
+def _coerce_weekly_research(result: Any) -> WeeklyResearch:
+    """Turn the agent's final output into `WeeklyResearch` by its actual type.
+
+    Structured outputs are validated directly; only raw text goes through
+    `_parse_weekly_research`, so a model instance never degrades to its repr.
+    """
+    if isinstance(result, WeeklyResearch):
+        return result
+    if isinstance(result, (dict, list)):
+        return WeeklyResearch.model_validate(result)
+    if isinstance(result, bytes):
+        return _parse_weekly_research(result.decode("utf-8", errors="replace"))
+    if isinstance(result, str) or result is None:
+        return _parse_weekly_research(result or "")
+    if hasattr(result, "model_dump"):
+        return WeeklyResearch.model_validate(result.model_dump())
+    return _parse_weekly_research(str(result))
+
+
+def _format_find_action(action) -> str:
+    return f"[Find] pattern={action.pattern!r} in url={action.url}"
+
+
+# Web search tool action type -> progress line for `deep_research_async`
+_ACTION_FORMATTERS = {
+    "search": lambda action: f"[Web search] query={action.query!r}",
+    "open_page": lambda action: f"[Open page] url={action.url}",
+    "find": _format_find_action,  # older openai releases
+    "find_in_page": _format_find_action,
+}
+
+
+# Template for `deep_research_async(use_mock=True)`, copied per call. Built
+# once with `model_construct`: the data is static and known to be valid.
+_WEEKLY_RESEARCH_MOCK = WeeklyResearch.model_construct(
+    research=(
+        "O cenário macro dos EUA segue favorável aos ativos de risco. Dados recentes de inflação vieram alinhados às expectativas, diminuindo o receio de que juros permaneçam mais altos por mais tempo ([www.reuters.com](https://www.reuters.com/business/wall-street-futures-mixed-investors-brace-inflation-data-2025-09-26/#:~:text=expectations%2C%20easing%20fears%20that%20persistent,week)). De fato, o Federal Reserve já iniciou cortes (0,25 ponto-base em 17/set, para faixa de 4,00–4,25%) e sinaliza mais reduções até o fim do ano ([www.reuters.com](https://www.reuters.com/business/fed-delivers-normal-sized-rate-cut-sees-steady-pace-further-reductions-miran-2025-09-17/#:~:text=On%20September%2017%2C%202025%2C%20the,growth%20and%20rising%20unemployment%2C%20while)). Projeções de mercado mostram praticamente 98% de chance de corte em outubro e 90% em dezembro ([www.reuters.com](https://www.reuters.com/business/bofa-global-research-moves-fed-rate-cut-forecast-october-december-2025-10-03/#:~:text=BofA%27s%20October%20cut%20projection,even%20without%20new%20employment%20data)), sustentadas por indicadores de desaquecimento do mercado de trabalho (em meio a paralisação do governo dos EUA que atrasou dados oficiais) ([www.reuters.com](https://www.reuters.com/business/bofa-global-research-moves-fed-rate-cut-forecast-october-december-2025-10-03/#:~:text=monetary%20policy,even%20without%20new%20employment%20data)). Assim, a política monetária está se tornando ainda mais expansionista, favorecendo ações de crescimento.\nNo campo do mercado de ações, os índices dos EUA vêm atingindo máximas históricas. Na última semana, S&P 500, Dow e Nasdaq bateram recordes, impulsionados principalmente por tecnologia e IA ([apnews.com](https://apnews.com/article/a08c07307c4483a3583fe2aaa1609637#:~:text=On%20Thursday%2C%20U,Investors)) ([apnews.com](https://apnews.com/article/be4301136953299b212c905e61e38fa9#:~:text=The%20S%26P%20500%20increased%20by,by%20OpenAI%27s%20new%20AI%20infrastructure)). Setores ligados a inteligência artificial continuam em alta (ex.: parcerias do OpenAI com empresas coreanas deram fôlego às ações de semicondutores e software ([apnews.com](https://apnews.com/article/be4301136953299b212c905e61e38fa9#:~:text=The%20S%26P%20500%20increased%20by,by%20OpenAI%27s%20new%20AI%20infrastructure)) ([apnews.com](https://apnews.com/article/a08c07307c4483a3583fe2aaa1609637#:~:text=largely%20ignored%20the%20shutdown%2C%20focusing,South%20Korean%20firms%2C%20boosting%20companies))). No entanto, há alertas de que uma bolha em ações de IA pode estar se formando devido ao excesso de euforia ([apnews.com](https://apnews.com/article/a08c07307c4483a3583fe2aaa1609637#:~:text=Concerns%20linger%20over%20a%20potential,its%20chemical%20unit%20to%20Berkshire)). Por outro lado, segmentos industriais e de infraestrutura (impulsionados por gastos públicos e reshoring) mantêm fundamentos sólidos no médio prazo, oferecendo diversificação defensiva e exposição ao crescimento econômico real.\nDiante desse contexto, adotamos uma postura mais ofensiva para a próxima semana, mas mantendo prudência com liquidez. Nossa exposição a tecnologia de ponta é reforçada: manteremos a posição em MSFT, líder em IA corporativa, e encerraremos o short em GOOG (cobertura de venda) porque a tendência geral do setor justifica reexecutar a compra de ações de alto crescimento. Paralelamente, diversificaremos adicionando posições em setores complementares. Em especial, entraremos em INTEL (INTC) e em um ETF de infraestrutura dos EUA (PAVE). A Intel recebeu recentemente um impulso significativo — a Nvidia anunciou investimento de US$5 bilhões na empresa ([www.reuters.com](https://www.reuters.com/world/asia-pacific/view-nvidias-5-billion-bet-intel-2025-09-18/#:~:text=Nvidia%20has%20announced%20a%20%245,while%20Nvidia%27s%20showed%20only)) — o que valida nossa tese de recuperação da fabricante de chips, ainda negociada a múltiplos bastante descontados. Já o ETF de infraestrutura captura o ciclo de investimentos domésticos (chegada de verbas de infraestrutura, CHIPS Act, etc.), oferecendo resiliência caso haja desaceleração econômica.\nApós os ajustes, cada posição representará cerca de 15–20% do portfólio, obedecendo ao limite máximo de 25% por ativo, e manteremos uma parcela em caixa acima de 10% como reserva. Minimizaremos alterações a não ser em resposta a novos dados (por exemplo, surpresas de inflação ou indicadores econômicos relevantes), evitando decisões precipitadas por ruído de mercado. Em resumo: seguimos otimistas com tecnologia e crescimento, mas equilibramos isso com diversificação em valor industrial e caixa para aproveitar oportunidades. Assim, para a próxima semana propomos cobrir o short em GOOG e comprar ações de GOOG, INTC e cotas de PAVE nas faixas de preço atuais."
+    ),
+    orders=[
+        Order.model_construct(ticker="GOOG", qty=2, price=246.45),
+        Order.model_construct(ticker="INTC", qty=10, price=36.83),
+        Order.model_construct(ticker="PAVE", qty=10, price=45.00),
+    ],
+)
 
 
 def _default_weekly_research_mock() -> WeeklyResearch:
@@ -133,72 +341,238 @@ def _default_weekly_research_mock() -> WeeklyResearch:
 
     The payload mirrors the structure produced by the real agent and uses
     the user-provided mock content to facilitate end-to-end testing without
-    network access or API credentials.
+    network access or API credentials. Each call gets its own deep copy, so
+    callers never share the template's `orders` list.
     """
-    payload = {
-        "research": (
-            "O cenário macro dos EUA segue favorável aos ativos de risco. Dados recentes de inflação vieram alinhados às expectativas, diminuindo o receio de que juros permaneçam mais altos por mais tempo ([www.reuters.com](https://www.reuters.com/business/wall-street-futures-mixed-investors-brace-inflation-data-2025-09-26/#:~:text=expectations%2C%20easing%20fears%20that%20persistent,week)). De fato, o Federal Reserve já iniciou cortes (0,25 ponto-base em 17/set, para faixa de 4,00–4,25%) e sinaliza mais reduções até o fim do ano ([www.reuters.com](https://www.reuters.com/business/fed-delivers-normal-sized-rate-cut-sees-steady-pace-further-reductions-miran-2025-09-17/#:~:text=On%20September%2017%2C%202025%2C%20the,growth%20and%20rising%20unemployment%2C%20while)). Projeções de mercado mostram praticamente 98% de chance de corte em outubro e 90% em dezembro ([www.reuters.com](https://www.reuters.com/business/bofa-global-research-moves-fed-rate-cut-forecast-october-december-2025-10-03/#:~:text=BofA%27s%20October%20cut%20projection,even%20without%20new%20employment%20data)), sustentadas por indicadores de desaquecimento do mercado de trabalho (em meio a paralisação do governo dos EUA que atrasou dados oficiais) ([www.reuters.com](https://www.reuters.com/business/bofa-global-research-moves-fed-rate-cut-forecast-october-december-2025-10-03/#:~:text=monetary%20policy,even%20without%20new%20employment%20data)). Assim, a política monetária está se tornando ainda mais expansionista, favorecendo ações de crescimento.\nNo campo do mercado de ações, os índices dos EUA vêm atingindo máximas históricas. Na última semana, S&P 500, Dow e Nasdaq bateram recordes, impulsionados principalmente por tecnologia e IA ([apnews.com](https://apnews.com/article/a08c07307c4483a3583fe2aaa1609637#:~:text=On%20Thursday%2C%20U,Investors)) ([apnews.com](https://apnews.com/article/be4301136953299b212c905e61e38fa9#:~:text=The%20S%26P%20500%20increased%20by,by%20OpenAI%27s%20new%20AI%20infrastructure)). Setores ligados a inteligência artificial continuam em alta (ex.: parcerias do OpenAI com empresas coreanas deram fôlego às ações de semicondutores e software ([apnews.com](https://apnews.com/article/be4301136953299b212c905e61e38fa9#:~:text=The%20S%26P%20500%20increased%20by,by%20OpenAI%27s%20new%20AI%20infrastructure)) ([apnews.com](https://apnews.com/article/a08c07307c4483a3583fe2aaa1609637#:~:text=largely%20ignored%20the%20shutdown%2C%20focusing,South%20Korean%20firms%2C%20boosting%20companies))). No entanto, há alertas de que uma bolha em ações de IA pode estar se formando devido ao excesso de euforia ([apnews.com](https://apnews.com/article/a08c07307c4483a3583fe2aaa1609637#:~:text=Concerns%20linger%20over%20a%20potential,its%20chemical%20unit%20to%20Berkshire)). Por outro lado, segmentos industriais e de infraestrutura (impulsionados por gastos públicos e reshoring) mantêm fundamentos sólidos no médio prazo, oferecendo diversificação defensiva e exposição ao crescimento econômico real.\nDiante desse contexto, adotamos uma postura mais ofensiva para a próxima semana, mas mantendo prudência com liquidez. Nossa exposição a tecnologia de ponta é reforçada: manteremos a posição em MSFT, líder em IA corporativa, e encerraremos o short em GOOG (cobertura de venda) porque a tendência geral do setor justifica reexecutar a compra de ações de alto crescimento. Paralelamente, diversificaremos adicionando posições em setores complementares. Em especial, entraremos em INTEL (INTC) e em um ETF de infraestrutura dos EUA (PAVE). A Intel recebeu recentemente um impulso significativo — a Nvidia anunciou investimento de US$5 bilhões na empresa ([www.reuters.com](https://www.reuters.com/world/asia-pacific/view-nvidias-5-billion-bet-intel-2025-09-18/#:~:text=Nvidia%20has%20announced%20a%20%245,while%20Nvidia%27s%20showed%20only)) — o que valida nossa tese de recuperação da fabricante de chips, ainda negociada a múltiplos bastante descontados. Já o ETF de infraestrutura captura o ciclo de investimentos domésticos (chegada de verbas de infraestrutura, CHIPS Act, etc.), oferecendo resiliência caso haja desaceleração econômica.\nApós os ajustes, cada posição representará cerca de 15–20% do portfólio, obedecendo ao limite máximo de 25% por ativo, e manteremos uma parcela em caixa acima de 10% como reserva. Minimizaremos alterações a não ser em resposta a novos dados (por exemplo, surpresas de inflação ou indicadores econômicos relevantes), evitando decisões precipitadas por ruído de mercado. Em resumo: seguimos otimistas com tecnologia e crescimento, mas equilibramos isso com diversificação em valor industrial e caixa para aproveitar oportunidades. Assim, para a próxima semana propomos cobrir o short em GOOG e comprar ações de GOOG, INTC e cotas de PAVE nas faixas de preço atuais."
-        ),
-        "orders": [
-            {"ticker": "GOOG", "qty": 2, "price": 246.45},
-            {"ticker": "INTC", "qty": 10, "price": 36.83},
-            {"ticker": "PAVE", "qty": 10, "price": 45.00},
-        ],
-    }
-    return WeeklyResearch.model_validate(payload)
+    return _WEEKLY_RESEARCH_MOCK.model_copy(deep=True)
 
 
 def _ensure_api_key() -> str:
+    _load_dotenv_once()
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("Missing OPENAI_API_KEY environment variable")
     return api_key
 
 
+_DOTENV_LOADED = False
+
+
+def _load_dotenv_once() -> None:
+    """Load `.env` into the process env (if python-dotenv is installed)."""
+    global _DOTENV_LOADED
+    if _DOTENV_LOADED:
+        return
+    _DOTENV_LOADED = True
+    try:
+        from dotenv import load_dotenv
+    except Exception:  # pragma: no cover - optional dependency
+        return
+    load_dotenv()  # nosec: loads .env into process env if present
+
+
 def _configure_openai_client(*, default_timeout_s: float) -> None:
     """Configure a shared OpenAI Async client with an increased timeout.
 
-    The Agents SDK will reuse this client via its OpenAIProvider if set.
+    The Agents SDK will reuse this client via its OpenAIProvider if set. Only
+    the env lookups run per call: the client for the resulting settings is
+    memoized by `_build_openai_client`. A default client installed by other
+    code is left alone. A missing or incompatible SDK falls back to its
+    defaults with a warning; invalid settings (e.g. a bad `OPENAI_BASE_URL`
+    or `OPENAI_TIMEOUT_SECONDS`) raise here.
     """
     try:
-        # Reuse if already set
-        existing = _agents_openai_shared.get_default_openai_client()
-        if existing is not None:
+        sdk = _import_sdk()
+        existing = sdk.openai_shared.get_default_openai_client()
+        if existing is not None and not _is_owned_client(existing):
             return
 
         timeout_override = os.getenv("OPENAI_TIMEOUT_SECONDS")
         timeout_val = (
             float(timeout_override) if timeout_override else float(default_timeout_s)
         )
-        max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
 
         api_key = os.getenv("OPENAI_API_KEY")
         base_url = os.getenv("OPENAI_BASE_URL") or None
         organization = os.getenv("OPENAI_ORG") or None
         project = os.getenv("OPENAI_PROJECT") or None
 
-        http_client = None
-        if httpx is not None:
-            http_client = httpx.AsyncClient(
-                timeout=httpx.Timeout(
-                    timeout_val, connect=30.0, read=timeout_val, write=timeout_val
-                )
+        with _CLIENT_LOCK:
+            client = _build_openai_client(
+                timeout_val, api_key, base_url, organization, project
             )
+        if client is not None and client is not existing:
+            sdk.openai_shared.set_default_openai_client(client)
+    except (ImportError, AttributeError):
+        logger.warning(
+            "Could not install the shared OpenAI client; using SDK defaults",
+            exc_info=True,
+        )
+
+
+@lru_cache(maxsize=4)
+def _build_openai_client(
+    timeout_val: float,
+    api_key: Optional[str],
+    base_url: Optional[str],
+    organization: Optional[str],
+    project: Optional[str],
+):
+    """Build the AsyncOpenAI client (and its pooled HTTP client) for one config."""
+    sdk = _import_sdk()
+    if sdk.AsyncOpenAI is None:
+        return None
+    http_client = _build_http_client(timeout_val)
+    client = sdk.AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        organization=organization,
+        project=project,
+        http_client=http_client,
+        timeout=timeout_val,
+        max_retries=0,  # `_run_with_backoff` owns retries
+    )
+    _OWNED_CLIENTS.append((http_client, client))
+    return client
+
 
-        if AsyncOpenAI is not None:
-            client = AsyncOpenAI(
-                api_key=api_key,
-                base_url=base_url,
-                organization=organization,
-                project=project,
-                http_client=http_client,
-                timeout=timeout_val,
-                max_retries=max_retries,
+async def _run_with_backoff(run: Callable[[], Awaitable[Any]]) -> Any:
+    """Await `run()`, retrying transient OpenAI errors with capped backoff.
+
+    Rate limits (429), overload (5xx) and connection errors (not timeouts) are
+    retried up to `OPENAI_MAX_RETRIES` times (default 2), sleeping for the
+    server's `Retry-After` when given, else exponentially, never longer than
+    RETRY_MAX_DELAY_SECONDS plus jitter.
+    """
+    max_retries = max(0, int(os.getenv("OPENAI_MAX_RETRIES", "2")))
+    for attempt in range(max_retries + 1):
+        try:
+            return await run()
+        except Exception as exc:
+            if attempt >= max_retries or not _is_retryable(exc):
+                raise
+            delay = _retry_after_seconds(exc)
+            if delay is None:
+                delay = RETRY_BASE_DELAY_SECONDS * 2**attempt
+            delay = min(delay, RETRY_MAX_DELAY_SECONDS)
+            delay += random.uniform(0, RETRY_JITTER_SECONDS)
+            print(
+                f"[openai_integration] {type(exc).__name__}; retry {attempt + 1}/{max_retries} in {delay:.2f}s"
             )
-            _agents_openai_shared.set_default_openai_client(client)
-    except Exception:
-        # If anything fails here, we fall back to SDK defaults
+            await asyncio.sleep(delay)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    openai = _import_sdk().openai
+    if openai is None:
+        return False
+    if isinstance(exc, openai.APITimeoutError):
+        # The timeout already spent the call's whole budget; don't double it
+        return False
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    return (
+        isinstance(exc, openai.APIStatusError)
+        and exc.status_code in RETRYABLE_STATUS_CODES
+    )
+
+
+def _retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Seconds from the error response's `retry-after(-ms)` header, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms is not None:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        retry_after = headers.get("retry-after")
+        if retry_after is not None:
+            return max(0.0, float(retry_after))
+    except (TypeError, ValueError):  # HTTP-date form: use our own backoff
+        return None
+    return None
+
+
+def _is_owned_client(client) -> bool:
+    return any(client is owned for _, owned in _OWNED_CLIENTS)
+
+
+def _build_http_client(timeout_val: float):
+    """Return the pooled async HTTP client for the OpenAI SDK, or None.
+
+    `OPENAI_HTTP_BACKEND=aiohttp` swaps httpx's transport for aiohttp (needs
+    the `openai[aiohttp]` extra), which holds up better with many concurrent
+    streams; anything else keeps plain httpx.
+    """
+    sdk = _import_sdk()
+    httpx = sdk.httpx
+    if httpx is None:
+        return None
+    kwargs = {
+        "timeout": httpx.Timeout(
+            timeout_val,
+            connect=HTTP_CONNECT_TIMEOUT_SECONDS,
+            read=timeout_val,
+            write=timeout_val,
+            pool=HTTP_POOL_TIMEOUT_SECONDS,
+        ),
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    }
+    backend = os.getenv("OPENAI_HTTP_BACKEND", "").strip().lower()
+    if backend == "aiohttp":
+        if sdk.DefaultAioHttpClient is None:
+            print("[openai_integration] aiohttp backend unavailable; using httpx")
+        else:
+            try:
+                return sdk.DefaultAioHttpClient(**kwargs)
+            except RuntimeError as exc:  # aiohttp extra not installed
+                print(f"[openai_integration] {exc}; using httpx")
+    # HTTP/2 multiplexes the SDK's requests over one connection; it needs the
+    # optional `h2` package (`pip install "httpx[http2]"`)
+    return httpx.AsyncClient(http2=_h2_available(), **kwargs)
+
+
+@cache
+def _h2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+async def aclose_openai_client() -> None:
+    """Close the OpenAI clients built here and their HTTP connection pools."""
+    with _CLIENT_LOCK:
+        owned = list(_OWNED_CLIENTS)
+        _OWNED_CLIENTS.clear()
+        _build_openai_client.cache_clear()
+        if owned:
+            shared = _import_sdk().openai_shared
+            if any(shared.get_default_openai_client() is client for _, client in owned):
+                shared.set_default_openai_client(None)
+    for http_client, client in owned:
+        await client.close()
+        if http_client is not None and not http_client.is_closed:
+            await http_client.aclose()
+
+
+@atexit.register
+def close_openai_client() -> None:
+    """Synchronous `aclose_openai_client`, also run at interpreter exit."""
+    if not _OWNED_CLIENTS:
         return
+    try:
+        asyncio.run(aclose_openai_client())
+    except Exception:
+        # Connections bound to an already closed event loop cannot be shut
+        # down cleanly; the process is going away anyway
+        pass
+
+
+# Compiled pydantic-core validator, called directly on the hot decode path
+_validate_weekly_research_json = WeeklyResearch.__pydantic_validator__.validate_json
 
 
 def _parse_weekly_research(raw_text: str) -> WeeklyResearch:
@@ -206,21 +580,79 @@ def _parse_weekly_research(raw_text: str) -> WeeklyResearch:
     if not text:
         return WeeklyResearch(research="", orders=[])
 
-    for candidate in (text, _extract_json_block(text)):
+    # Encode once: the fence scan and pydantic-core both work on UTF-8 bytes
+    data = text.encode("utf-8")
+    # Only a bare object can be the payload; skip the doomed parse on prose
+    bare = data if data.startswith(b"{") and data.endswith(b"}") else None
+    for candidate in (bare, _extract_json_block(data)):
         if not candidate:
             continue
         try:
-            payload = json.loads(candidate)
-            return WeeklyResearch.model_validate(payload)
+            # pydantic-core parses and validates in one pass, no interim dict
+            return _validate_weekly_research_json(candidate)
         except Exception:
             continue
 
+    # Unfenced object embedded in prose: try each balanced top-level span
+    span = _find_json_span(data)
+    while span is not None:
+        start, end = span
+        if data[start:end] != bare:
+            try:
+                return _validate_weekly_research_json(data[start:end])
+            except Exception:
+                pass
+        span = _find_json_span(data, end)
+
     return WeeklyResearch(research=text, orders=[])
 
 
-def _extract_json_block(text: str) -> str | None:
-    match = JSON_FENCE_PATTERN.search(text)
-    return match.group(1) if match else None
+def _extract_json_block(data: bytes) -> bytes | None:
+    """Return the body of the first ``` fenced block (optional `json` tag)."""
+    start = data.find(JSON_FENCE)
+    if start == -1:
+        return None
+    start += len(JSON_FENCE)
+    end = data.find(JSON_FENCE, start)
+    if end == -1:
+        return None
+    if data[start : start + 4].lower() == b"json":
+        start += 4
+    return data[start:end].lstrip()
+
+
+def _find_json_span(data: bytes, pos: int = 0) -> Optional[tuple[int, int]]:
+    """Return `(start, end)` of the first balanced `{...}` at or after `pos`.
+
+    One forward pass that hops between brace, quote and backslash bytes,
+    ignoring braces inside JSON strings (escape aware). None when no object
+    opens or the first one never closes.
+    """
+    start = data.find(b"{", pos)
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped_at = -1  # index of the byte consumed by the last backslash
+    for match in _JSON_SCAN_TOKENS.finditer(data, start):
+        i = match.start()
+        token = data[i]
+        if in_string:
+            if i == escaped_at:
+                continue
+            if token == 0x5C:  # backslash: the next byte is literal
+                escaped_at = i + 1
+            elif token == 0x22:  # closing quote
+                in_string = False
+        elif token == 0x7B:  # {
+            depth += 1
+        elif token == 0x7D:  # }
+            depth -= 1
+            if depth == 0:
+                return start, i + 1
+        elif token == 0x22:  # opening quote
+            in_string = True
+    return None
 
 
 def main(argv: Optional[list[str]] = None) -> None:
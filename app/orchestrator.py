@@ -9,29 +9,87 @@ if (
 ):  # pragma: no cover - script execution fallback
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.data.collector import (
-    get_all_positions,
-    get_latest_cash,
-    get_latest_orders,
-    get_latest_weekly_research,
-)
-from app.data.inserter import insert_new_order
-from app.openai_integration import deep_research_async, send_prompt
-from app.services.context_builder import build_market_context
-from app.services.post_trade import apply_orders_and_persist
-from app.prompts.prompts import Prompts
-
-
-def weekday_processing():
+from app.services.cache import FileCache, digest
+
+# pandas, the data layer and the OpenAI SDK are imported inside the routines,
+# so `--help` and the idle scheduler do not pay their import cost
+
+# Reads reused across runs within a window; entries are dropped on writes
+_CACHE = FileCache()
+SNAPSHOT_CACHE_TTL_SECONDS = 5 * 60
+LAST_TICKERS_TTL_SECONDS = 7 * 24 * 60 * 60
+PROMPT_CACHE_TTL_SECONDS = 10 * 60
+
+
+def _cached_snapshot(orders_start_date=None):
+    from app.data.collector import get_latest_snapshot
+
+    return _CACHE.get_or_fetch(
+        "latest_snapshot",
+        get_latest_snapshot,
+        orders_start_date=orders_start_date,
+        ttl=SNAPSHOT_CACHE_TTL_SECONDS,
+    )
+
+
+def _cached_daily_prompt(**inputs) -> str:
+    """`Prompts.daily_ai_prompt(**inputs)`, reused while the inputs are unchanged.
+
+    A retry shortly after a failed run renders the same prompt, so it is
+    looked up by a digest of the inputs instead of reformatting every frame.
+    """
+    from app.prompts.prompts import Prompts
+
+    key = digest(*(inputs[name] for name in sorted(inputs)))
+    return _CACHE.get_or_fetch(
+        "daily_prompt",
+        lambda _key: Prompts.daily_ai_prompt(**inputs),
+        key,
+        ttl=PROMPT_CACHE_TTL_SECONDS,
+    )
+
+
+def _prefetch_last_tickers() -> None:
+    """Warm the collector's quote cache with the previous run's tickers.
+
+    Runs while positions load; `build_market_context` then only downloads
+    tickers that changed since. Must finish before that call starts, since
+    yfinance downloads share module-global state.
+    """
+    tickers = _CACHE.get("last_tickers", ttl=LAST_TICKERS_TTL_SECONDS)
+    if not tickers:
+        return
+    from app.data.collector import get_stock_data
+
+    get_stock_data(list(tickers))
+
+
+async def weekday_processing():
     """Processing routine for Monday–Friday.
 
     Reads tickers from env var `TICKERS` (comma-separated) or uses a small default list.
     Calls the data collector and returns the fetched data.
     """
-    positions_df = get_all_positions()
+    from app.data.collector import get_latest_weekly_research
+    from app.openai_integration import send_prompt_async
+    from app.services.context_builder import build_market_context
+    from app.services.post_trade import apply_orders_and_persist_atomic
+
+    # Cash, yesterday's orders and positions come from one DB snapshot; quotes
+    # for the last run's tickers are fetched meanwhile
+    snapshot, _ = await asyncio.gather(
+        asyncio.to_thread(_cached_snapshot),
+        asyncio.to_thread(_prefetch_last_tickers),
+    )
+    positions_df = snapshot.positions
     print(f"[weekday_processing] Loaded positions rows: {len(positions_df)}")
 
-    market_ctx = build_market_context(positions_df)
+    # The research file is read while market data is being fetched
+    market_ctx, weekly_research = await asyncio.gather(
+        asyncio.to_thread(build_market_context, positions_df),
+        asyncio.to_thread(get_latest_weekly_research),
+    )
+    _CACHE.put("last_tickers", market_ctx.tickers)
     print(f"[weekday_processing] Fetched market data for tickers: {market_ctx.tickers}")
     print(
         f"[weekday_processing] Upserted {market_ctx.inserted_rows} rows into stocks_info (sqlite)"
@@ -39,10 +97,8 @@ def weekday_processing():
 
     latest_prices_df = market_ctx.latest_prices_df
 
-    # Fetch latest cash info and all positions before sending the prompt
-    latest_cash = get_latest_cash()
-    weekly_research = get_latest_weekly_research()
-    latest_orders = get_latest_orders()
+    latest_cash = snapshot.cash
+    latest_orders = snapshot.orders
     print(f"[weekday_processing] Latest cash: {latest_cash.get('amount')}")
     print(
         f"[weekday_processing] Weekly research date: {weekly_research.get('date_str','')}, chars: {len(weekly_research.get('text',''))}"
@@ -52,14 +108,15 @@ def weekday_processing():
     )
 
     # Build and send the daily AI prompt
-    prompt_text = Prompts.daily_ai_prompt(
+    prompt_text = _cached_daily_prompt(
         positions_df=positions_df,
         latest_cash=latest_cash,
         latest_orders=latest_orders,
         weekly_research=weekly_research,
         latest_prices_df=latest_prices_df,
+        tickers_str=market_ctx.tickers_str,
     )
-    ai_decision = send_prompt(prompt_text)
+    ai_decision = await send_prompt_async(prompt_text)
 
     orders = ai_decision.orders
 
@@ -67,12 +124,10 @@ def weekday_processing():
         print(f"[weekday_processing] No orders for today")
         return
 
-    print(f"[weekday_processing] Inserting {len(orders)} orders")
-    for order in orders:
-        insert_new_order(order)
-        print(f"[weekday_processing] Order inserted: {order}")
-
-    post_trade = apply_orders_and_persist(orders)
+    # Orders, positions and the cash snapshot are committed together
+    post_trade = apply_orders_and_persist_atomic(orders)
+    _CACHE.invalidate("latest_snapshot")
+    print(f"[weekday_processing] Inserted {post_trade.orders_count} orders: {orders}")
     print(
         f"[weekday_processing] Cash snapshot written for {post_trade.as_of_date}: prev={post_trade.previous_cash:.2f} -> new={post_trade.new_cash:.2f}"
     )
@@ -86,10 +141,29 @@ async def sunday_processing():
     Reads tickers from env var `SUNDAY_TICKERS` or falls back to `TICKERS`/default.
     Calls the data collector and returns the fetched data.
     """
-    positions_df = get_all_positions()
+    from app.data.collector import get_latest_weekly_research
+    from app.openai_integration import deep_research_async
+    from app.prompts.prompts import Prompts
+    from app.services.context_builder import build_market_context
+    from app.services.post_trade import apply_orders_and_persist
+
+    # Cash, last week's orders and positions come from one DB snapshot; quotes
+    # for the last run's tickers are fetched meanwhile
+    snapshot, _ = await asyncio.gather(
+        asyncio.to_thread(
+            _cached_snapshot, orders_start_date=date.today() - timedelta(days=7)
+        ),
+        asyncio.to_thread(_prefetch_last_tickers),
+    )
+    positions_df = snapshot.positions
     print(f"[sunday_processing] Loaded positions rows: {len(positions_df)}")
 
-    market_ctx = build_market_context(positions_df)
+    # The research file is read while market data is being fetched
+    market_ctx, weekly_research = await asyncio.gather(
+        asyncio.to_thread(build_market_context, positions_df),
+        asyncio.to_thread(get_latest_weekly_research),
+    )
+    _CACHE.put("last_tickers", market_ctx.tickers)
     print(f"[sunday_processing] Fetched market data for tickers: {market_ctx.tickers}")
     print(
         f"[sunday_processing] Upserted {market_ctx.inserted_rows} rows into stocks_info (sqlite)"
@@ -97,10 +171,8 @@ async def sunday_processing():
 
     latest_prices_df = market_ctx.latest_prices_df
 
-    # Fetch latest cash info and all positions before sending the prompt
-    latest_cash = get_latest_cash()
-    weekly_research = get_latest_weekly_research()
-    weekly_orders = get_latest_orders(start_date=date.today() - timedelta(days=7))
+    latest_cash = snapshot.cash
+    weekly_orders = snapshot.orders
     print(f"[sunday_processing] Latest cash: {latest_cash.get('amount')}")
     print(
         f"[sunday_processing] Weekly research date: {weekly_research.get('date_str','')}, chars: {len(weekly_research.get('text',''))}"
@@ -115,6 +187,7 @@ async def sunday_processing():
         weekly_orders=weekly_orders,
         latest_prices_df=latest_prices_df,
         weekly_research=weekly_research,
+        tickers_str=market_ctx.tickers_str,
     )
 
     new_weekly_research = await deep_research_async(prompt)
@@ -124,14 +197,10 @@ async def sunday_processing():
         research_text = getattr(new_weekly_research, "research", "") or ""
         if research_text.strip():
             today_str = date.today().strftime("%Y-%m-%d")
-            header_line = f"# {today_str}\n"
-            # Ensure a clean separation from previous content and append section
-            with open("ai_weekly_research.md", "a", encoding="utf-8") as f:
-                f.write("\n" if not research_text.startswith("\n") else "")
-                f.write(header_line)
-                f.write("\n")
-                f.write(research_text.rstrip())
-                f.write("\n")
+            # Ensure a clean separation from previous content; one write per section
+            prefix = "" if research_text.startswith("\n") else "\n"
+            section = f"{prefix}# {today_str}\n\n{research_text.rstrip()}\n"
+            _append_bytes("ai_weekly_research.md", section.encode("utf-8"))
             print(
                 f"[sunday_processing] Appended weekly research to ai_weekly_research.md with header {today_str}"
             )
@@ -146,6 +215,7 @@ async def sunday_processing():
     orders = new_weekly_research.orders
 
     post_trade = apply_orders_and_persist(orders)
+    _CACHE.invalidate("latest_snapshot")
     print(
         f"[sunday_processing] Cash snapshot written for {post_trade.as_of_date}: prev={post_trade.previous_cash:.2f} -> new={post_trade.new_cash:.2f}"
     )
@@ -153,6 +223,39 @@ async def sunday_processing():
     return
 
 
+def _append_bytes(path: str, data: bytes) -> None:
+    """Append `data` to `path` through an unbuffered O_APPEND descriptor.
+
+    Each write lands at the current end of file, so concurrent appenders never
+    interleave mid-write; usually a single syscall.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view) :]
+    finally:
+        os.close(fd)
+
+
+def run_routine(routine) -> None:
+    """Run an async processing routine on a fresh event loop.
+
+    The pooled OpenAI client is bound to the loop it was used on, so it is
+    closed before the loop ends; the next run builds a new one.
+    """
+
+    from app.openai_integration import aclose_openai_client
+
+    async def _run():
+        try:
+            await routine()
+        finally:
+            await aclose_openai_client()
+
+    asyncio.run(_run())
+
+
 def main(argv=None):
     """CLI entry to test processing.
 
@@ -170,9 +273,9 @@ def main(argv=None):
     args = parser.parse_args(argv)
 
     if args.run == "weekday":
-        weekday_processing()
+        run_routine(weekday_processing)
     else:
-        asyncio.run(sunday_processing())
+        run_routine(sunday_processing)
 
 
 if __name__ == "__main__":
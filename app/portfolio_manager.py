@@ -1,13 +1,15 @@
 from __future__ import annotations
 
+import math
 from dataclasses import dataclass
 from datetime import date
+from operator import itemgetter
 from typing import Iterable, Optional, Tuple
 
 from domain.models import Order
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PortfolioPosition:
     date: Optional[date]
     ticker: str
@@ -15,7 +17,7 @@ class PortfolioPosition:
     avg_price: Optional[float]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Portfolio:
     positions: Tuple[PortfolioPosition, ...]
 
@@ -23,8 +25,39 @@ class Portfolio:
     def from_rows(cls, rows: Iterable[PortfolioPosition]) -> "Portfolio":
         return cls(tuple(rows))
 
+    @classmethod
+    def from_columns(
+        cls,
+        dates: Iterable[Optional[date]],
+        tickers: Iterable[str],
+        qty: Iterable[Optional[float]],
+        avg_price: Iterable[Optional[float]],
+    ) -> "Portfolio":
+        """Build a portfolio from parallel columns (lists or numpy arrays).
+
+        Missing numeric values (None/NaN) are stored as None.
+        """
+        return cls(
+            tuple(
+                PortfolioPosition(
+                    date=d,
+                    ticker=t,
+                    qty=_optional_float(q),
+                    avg_price=_optional_float(p),
+                )
+                for d, t, q, p in zip(dates, tickers, qty, avg_price)
+            )
+        )
+
+
+def _optional_float(value: object) -> Optional[float]:
+    if value is None:
+        return None
+    number = float(value)
+    return None if math.isnan(number) else number
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class CashSnapshot:
     """Represents a cash balance snapshot for a given date.
 
@@ -41,15 +74,44 @@ class CashSnapshot:
 
 def apply_orders(portfolio: Portfolio, orders: Iterable[Order]) -> Portfolio:
     """Apply executed orders to the current portfolio and return the updated state."""
+    return apply_orders_with_cash(portfolio, orders, 0.0)[0]
+
+
+def apply_orders_with_cash(
+    portfolio: Portfolio, orders: Iterable[Order], prev_cash: float
+) -> Tuple[Portfolio, float, int]:
+    """Apply `orders` to `portfolio` and to the `prev_cash` balance in one pass.
+
+    Cash sign convention (matches Order), no fees applied:
+      - qty > 0 (buy) consumes cash: delta = -qty * price
+      - qty < 0 (sell) adds cash:   delta = -qty * price
 
-    positions_by_ticker: dict[str, PortfolioPosition] = {}
-    for position in portfolio.positions:
-        key = position.ticker
-        if key:
-            positions_by_ticker[str(key)] = position
+    `orders` is consumed once, so a generator works without being copied.
+    Returns the updated portfolio, the cash balance after the orders and the
+    number of orders consumed.
+    """
 
+    # ticker -> [date, ticker, qty, avg_price, untouched original or None].
+    # Orders update the lists in place; frozen positions are only built once
+    # per changed ticker at the end, and untouched ones are reused as is.
+    state: dict[str, list] = {
+        position.ticker: [
+            position.date,
+            position.ticker,
+            position.qty,
+            position.avg_price,
+            position,
+        ]
+        for position in portfolio.positions
+        if position.ticker
+    }
+
+    cash_delta = 0.0
+    count = 0
     for order in orders:
-        ticker_key = str(order.ticker)
+        count += 1
+        # `Order.ticker` is validated as str by pydantic; no cast needed
+        ticker_key = order.ticker
         if not ticker_key:
             raise ValueError("Order ticker must be a non-empty string")
 
@@ -58,26 +120,20 @@ def apply_orders(portfolio: Portfolio, orders: Iterable[Order]) -> Portfolio:
             continue
 
         price = float(order.price)
+        # Buys consume cash, sells add it (see the docstring)
+        cash_delta += -(delta_qty * price)
 
-        existing = positions_by_ticker.get(ticker_key)
+        entry = state.get(ticker_key)
 
-        if existing is None:
+        if entry is None:
             if delta_qty < 0:
                 raise ValueError(
                     f"Cannot sell ticker '{ticker_key}' that is not in the portfolio"
                 )
-            positions_by_ticker[ticker_key] = PortfolioPosition(
-                date=None,
-                ticker=ticker_key,
-                qty=delta_qty,
-                avg_price=price,
-            )
+            state[ticker_key] = [None, ticker_key, delta_qty, price, None]
             continue
 
-        existing_qty = float(existing.qty) if existing.qty is not None else 0.0
-        existing_avg_price = (
-            float(existing.avg_price) if existing.avg_price is not None else 0.0
-        )
+        existing_qty = float(entry[2]) if entry[2] is not None else 0.0
 
         new_qty = existing_qty + delta_qty
 
@@ -87,7 +143,7 @@ def apply_orders(portfolio: Portfolio, orders: Iterable[Order]) -> Portfolio:
             )
 
         if abs(new_qty) < 1e-9:
-            positions_by_ticker.pop(ticker_key, None)
+            del state[ticker_key]
             continue
 
         if new_qty < 0:
@@ -96,35 +152,16 @@ def apply_orders(portfolio: Portfolio, orders: Iterable[Order]) -> Portfolio:
             )
 
         if delta_qty > 0:
+            existing_avg_price = float(entry[3]) if entry[3] is not None else 0.0
             total_cost = existing_qty * existing_avg_price + delta_qty * price
-            new_avg_price = total_cost / new_qty if new_qty else price
-        else:
-            new_avg_price = existing.avg_price
-
-        positions_by_ticker[ticker_key] = PortfolioPosition(
-            date=existing.date,
-            ticker=existing.ticker,
-            qty=new_qty,
-            avg_price=new_avg_price,
-        )
-
-    updated_positions = sorted(positions_by_ticker.values(), key=lambda pos: pos.ticker)
-    return Portfolio.from_rows(updated_positions)
-
-
-def compute_cash_after_orders(prev_cash: float, orders: Iterable[Order]) -> float:
-    """Compute end-of-day cash from previous cash and executed orders.
-
-    Sign convention (matches Order):
-      - qty > 0 (buy) consumes cash: delta = -qty * price
-      - qty < 0 (sell) adds cash:   delta = -qty * price
-
-    No fees are applied.
-    """
-    delta = 0.0
-    for o in orders or []:
-        # Ensure numeric types
-        q = float(o.qty)
-        p = float(o.price)
-        delta += -(q * p)
-    return float(prev_cash) + delta
+            entry[3] = total_cost / new_qty if new_qty else price
+        entry[2] = new_qty
+        entry[4] = None
+
+    updated_positions = [
+        original
+        if original is not None
+        else PortfolioPosition(date=d, ticker=t, qty=q, avg_price=ap)
+        for d, t, q, ap, original in sorted(state.values(), key=itemgetter(1))
+    ]
+    return Portfolio.from_rows(updated_positions), float(prev_cash) + cash_delta, count
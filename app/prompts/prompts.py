@@ -1,18 +1,160 @@
 from __future__ import annotations
 
+import weakref
 from typing import Dict, Any, List, Optional
 
+from app.data._common import unique_tickers
 
-def _df_to_text(df) -> str:
-    """Render a DataFrame-like object as a plain-text table."""
+
+# Row caps for the embedded tables; longer frames are elided in the middle by
+# pandas (the row counts are still stated in the prompt). Prices have one row
+# per ticker and are never capped.
+POSITIONS_MAX_ROWS = 50
+ORDERS_MAX_ROWS = 20
+
+# id(frame) -> (weakref to frame, shape, columns, limits, rendered text). An
+# entry is dropped as soon as its frame is collected, so a reused id never hits it.
+_RENDERED_FRAMES: Dict[int, tuple] = {}
+
+
+def _df_to_text(
+    df, max_rows: Optional[int] = None, max_cols: Optional[int] = None
+) -> str:
+    """Render a DataFrame-like object as a plain-text table.
+
+    `to_string` is slow, and the daily and weekend prompts embed the same
+    frames; renders are memoized per live frame object (keyed by identity,
+    shape, columns and limits, so frames are expected not to be edited in
+    place). `max_rows`/`max_cols` bound the formatting cost for long frames.
+    """
     if df is None or getattr(df, "empty", True):
         return ""
+    key = id(df)
+    limits = (max_rows, max_cols)
     try:
-        return df.to_string(index=False)
+        shape, columns = df.shape, tuple(df.columns)
+    except Exception:
+        return _render_df(df, limits)
+    cached = _RENDERED_FRAMES.get(key)
+    if cached is not None and cached[0]() is df and cached[1:4] == (shape, columns, limits):
+        return cached[4]
+    text = _render_df(df, limits)
+    try:
+        ref = weakref.ref(df, lambda _ref, key=key: _RENDERED_FRAMES.pop(key, None))
+    except TypeError:
+        return text
+    _RENDERED_FRAMES[key] = (ref, shape, columns, limits, text)
+    return text
+
+
+def _render_df(df, limits: tuple) -> str:
+    max_rows, max_cols = limits
+    try:
+        return df.to_string(index=False, max_rows=max_rows, max_cols=max_cols)
     except Exception:
         return ""
 
 
+def _position_tickers(positions_df) -> List[str]:
+    if positions_df is None or positions_df.empty or "ticker" not in positions_df:
+        return []
+    return unique_tickers(positions_df["ticker"])
+
+
+# Static instructions around each prompt's per-call inputs; only the middle
+# is formatted per call
+_DAILY_PREFIX = (
+    "Você é um gestor tático de uma carteira de ações dos EUA.\n"
+    "Seu papel é analisar diariamente os dados recebidos sobre a carteira atual, execuções passadas e caixa disponível, e decidir se deve comprar, vender ou manter ativos, alinhado à teoria macro definida no domingo.\n\n"
+    "Objetivo\n\n"
+    "- Maximizar o retorno acumulado em 5 anos.\n"
+    "- Seguir a estratégia macro definida no domingo.\n"
+    "- Proteger a carteira de riscos excessivos e perdas permanentes.\n"
+    "- Agir apenas quando necessário (evitar trades desnecessários).\n\n"
+    "Insumos recebidos hoje (dados reais)\n\n"
+)
+
+_DAILY_SUFFIX = (
+    "Restrições (sempre respeitar)\n\n"
+    "- Sem alavancagem.\n"
+    "- Sem derivativos.\n"
+    "- Considerar custos de transação simbólicos a cada trade.\n"
+    "- Não concentrar >25% do portfólio em um único ativo.\n"
+    "- Manter pelo menos 10% do portfólio em caixa.\n"
+    "- Rebalancear quando necessário.\n"
+    "- Não é obrigatório agir todos os dias.\n\n"
+    "Como responder\n\n"
+    "- Resumo diário (1–2 parágrafos): análise do dia, impacto dos preços nas posições, riscos e aderência à teoria macro.\n"
+    "- Decisão tática: Manter (sem novas ordens) OU Comprar/Vender (listar ordens com ticker, quantidade, preço-alvo aproximado).\n"
+    "- Justificativa: por que essas ordens ou inação fazem sentido, considerando teoria macro e restrições.\n\n"
+    "Importante\n\n"
+    "- Se não houver oportunidades claras, afirme: 'Hoje não há trades recomendados.'\n"
+    "- Se houver necessidade de ajuste (ex.: concentração alta, caixa abaixo do limite, posição desalinhada da macro), proponha rebalanceamento.\n"
+    "- Você é o agente tático; siga o plano estratégico de domingo como guia.\n"
+    "- Sempre referenciar a coluna close de latest_prices para justificar preços de entrada/saída.\n"
+)
+
+_WEEKEND_PREFIX = (
+    "Você é um gestor estratégico de uma carteira de ações dos EUA.\n"
+    "Seu papel é criar uma teoria macro para ser seguida durante a semana, baseado nos dados recebidos sobre a carteira atual, execuções passadas, caixa disponível e acontecimentos da última semana no mundo, e decidir quais ações manter, vender ou comprar \n\n"
+    "Objetivo\n\n"
+    "- Maximizar o retorno acumulado em 5 anos.\n"
+    "- Criar uma estratégia macro para ser seguida na próxima semana.\n"
+    "- Escolher como e se mudar a carteira atual\n"
+    "- Analisar se houve mudanças consideráveis da última teoria e se é necessário mudar algo na carteira ou teoria.\n\n"
+    "Insumos recebidos hoje (dados reais)\n\n"
+)
+
+_WEEKEND_SUFFIX = (
+    "Restrições (sempre respeitar)\n\n"
+    "- Sem alavancagem.\n"
+    "- Sem derivativos.\n"
+    "- Considerar custos de transação simbólicos a cada trade.\n"
+    "- Não concentrar >25% do portfólio em um único ativo.\n"
+    "- Manter pelo menos 10% do portfólio em caixa.\n"
+    "- Rebalancear quando necessário.\n"
+    "- Não é obrigatório agir.\n\n"
+    "Preferências de seleção (foco em small caps)\n\n"
+    "- Priorizar empresas small caps com potencial de crescimento acelerado.\n"
+    "- Em geral, preferir capitalização de mercado < US$5B;\n"
+    "  evitar large/mega caps (> US$10B), salvo catalisador excepcional.\n"
+    "- Usar a ferramenta de busca para verificar a capitalização de mercado\n"
+    "  aproximada e citar os principais catalisadores no texto de pesquisa.\n"
+    "Como responder\n\n"
+    "- research: Criação da teoria macro para a próxima semana, a estimativa de capitalização de mercado (quando relevante) e os catalisadores de crescimento.\n"
+    "- orders: Manter (sem novas ordens) OU Comprar/Vender (listar ordens com ticker, quantidade, preço-alvo aproximado).\n"
+    "Importante\n\n"
+    "- Se não houver oportunidades claras, afirme: 'Hoje não há trades recomendados.'\n"
+    "- Se houver necessidade de ajuste (ex.: concentração alta, caixa abaixo do limite, posição desalinhada da macro), proponha rebalanceamento.\n"
+    "- Sempre referenciar a coluna close de latest_prices para justificar preços de entrada/saída.\n"
+)
+
+
+def _context_blocks(
+    positions_block: str,
+    prices_block: str,
+    orders_block: str,
+    research_date: str,
+    research_text: str,
+) -> str:
+    """The snapshot/prices/orders/research sections shared by both prompts."""
+    return "\n".join(
+        (
+            "",
+            "--- positions snapshot ---",
+            positions_block,
+            "--- latest_prices (fechamento oficial do dia) ---",
+            prices_block,
+            "--- latest_orders (última data) ---",
+            orders_block,
+            f"--- weekly_research ({research_date}) ---",
+            research_text,
+            "",
+            "",
+        )
+    )
+
+
 class Prompts:
     """Centralized prompt builder for AI requests.
 
@@ -27,20 +169,18 @@ class Prompts:
         latest_orders,  # pandas.DataFrame | None
         weekly_research: Dict[str, Any],
         latest_prices_df=None,  # pandas.DataFrame | None
+        tickers_str: Optional[str] = None,
     ) -> str:
         """Build a concise daily AI prompt using portfolio and research context.
 
-        Expects cleaned dataframes/objects from collector helpers.
+        Expects cleaned dataframes/objects from collector helpers. Pass
+        `tickers_str` (e.g. `MarketContext.tickers_str`) to skip rescanning the
+        positions' tickers.
         """
         # Positions summary
-        tickers: List[str] = []
-        if positions_df is not None and not positions_df.empty:
-            seen = set()
-            for t in positions_df.get("ticker", []).astype(str).tolist():
-                if t and t not in seen:
-                    seen.add(t)
-                    tickers.append(t)
-        tickers_str = ", ".join(tickers) if tickers else "(none)"
+        if tickers_str is None:
+            tickers = _position_tickers(positions_df)
+            tickers_str = ", ".join(tickers) if tickers else "(none)"
 
         # Cash summary
         cash_amt = latest_cash.get("amount") if latest_cash else None
@@ -59,14 +199,14 @@ class Prompts:
                 )
             except Exception:
                 orders_preview = ""
-        orders_block = _df_to_text(latest_orders) or "[sem ordens recentes]"
+        orders_block = _df_to_text(latest_orders, ORDERS_MAX_ROWS) or "[sem ordens recentes]"
 
         # Weekly research (full text)
         research_date = (weekly_research or {}).get("date_str", "")
         research_text = (weekly_research or {}).get("text", "").strip()
 
         # Positions snapshot
-        positions_block = _df_to_text(positions_df) or "[sem posições registradas]"
+        positions_block = _df_to_text(positions_df, POSITIONS_MAX_ROWS) or "[sem posições registradas]"
 
         # Latest market prices (daily close)
         try:
@@ -82,46 +222,16 @@ class Prompts:
             price_rows = len(latest_prices_df)
             prices_block = _df_to_text(latest_prices_df) or "[sem preços disponíveis]"
 
-        prompt = (
-            "Você é um gestor tático de uma carteira de ações dos EUA.\n"
-            "Seu papel é analisar diariamente os dados recebidos sobre a carteira atual, execuções passadas e caixa disponível, e decidir se deve comprar, vender ou manter ativos, alinhado à teoria macro definida no domingo.\n\n"
-            "Objetivo\n\n"
-            "- Maximizar o retorno acumulado em 5 anos.\n"
-            "- Seguir a estratégia macro definida no domingo.\n"
-            "- Proteger a carteira de riscos excessivos e perdas permanentes.\n"
-            "- Agir apenas quando necessário (evitar trades desnecessários).\n\n"
-            "Insumos recebidos hoje (dados reais)\n\n"
+        dynamic = (
             f"- Universo de tickers nas posições: {tickers_str}\n"
             f"- Caixa: amount={cash_amt}, total_portfolio_amount={total_amt}\n"
             f"- Ordens mais recentes (linhas: {orders_rows}; prévia: {orders_preview})\n"
             f"- Dados de preços de fechamento de hoje (linhas: {price_rows}) listados em latest_prices\n"
-            "\n--- positions snapshot ---\n"
-            f"{positions_block}\n"
-            "--- latest_prices (fechamento oficial do dia) ---\n"
-            f"{prices_block}\n"
-            "--- latest_orders (última data) ---\n"
-            f"{orders_block}\n"
-            f"--- weekly_research ({research_date}) ---\n"
-            f"{research_text}\n\n"
-            "Restrições (sempre respeitar)\n\n"
-            "- Sem alavancagem.\n"
-            "- Sem derivativos.\n"
-            "- Considerar custos de transação simbólicos a cada trade.\n"
-            "- Não concentrar >25% do portfólio em um único ativo.\n"
-            "- Manter pelo menos 10% do portfólio em caixa.\n"
-            "- Rebalancear quando necessário.\n"
-            "- Não é obrigatório agir todos os dias.\n\n"
-            "Como responder\n\n"
-            "- Resumo diário (1–2 parágrafos): análise do dia, impacto dos preços nas posições, riscos e aderência à teoria macro.\n"
-            "- Decisão tática: Manter (sem novas ordens) OU Comprar/Vender (listar ordens com ticker, quantidade, preço-alvo aproximado).\n"
-            "- Justificativa: por que essas ordens ou inação fazem sentido, considerando teoria macro e restrições.\n\n"
-            "Importante\n\n"
-            "- Se não houver oportunidades claras, afirme: 'Hoje não há trades recomendados.'\n"
-            "- Se houver necessidade de ajuste (ex.: concentração alta, caixa abaixo do limite, posição desalinhada da macro), proponha rebalanceamento.\n"
-            "- Você é o agente tático; siga o plano estratégico de domingo como guia.\n"
-            "- Sempre referenciar a coluna close de latest_prices para justificar preços de entrada/saída.\n"
+            + _context_blocks(
+                positions_block, prices_block, orders_block, research_date, research_text
+            )
         )
-        return prompt
+        return _DAILY_PREFIX + dynamic + _DAILY_SUFFIX
 
     @staticmethod
     def weekend_ai_prompt(
@@ -131,20 +241,18 @@ class Prompts:
         weekly_orders,  # pandas.DataFrame | None
         weekly_research: Dict[str, Any],
         latest_prices_df=None,  # pandas.DataFrame | None,
+        tickers_str: Optional[str] = None,
     ) -> str:
         """Build the weekend prompt using portfolio and research context.
 
-        Expects cleaned dataframes/objects from collector helpers.
+        Expects cleaned dataframes/objects from collector helpers. Pass
+        `tickers_str` (e.g. `MarketContext.tickers_str`) to skip rescanning the
+        positions' tickers.
         """
         # Positions summary
-        tickers: List[str] = []
-        if positions_df is not None and not positions_df.empty:
-            seen = set()
-            for t in positions_df.get("ticker", []).astype(str).tolist():
-                if t and t not in seen:
-                    seen.add(t)
-                    tickers.append(t)
-        tickers_str = ", ".join(tickers) if tickers else "(none)"
+        if tickers_str is None:
+            tickers = _position_tickers(positions_df)
+            tickers_str = ", ".join(tickers) if tickers else "(none)"
 
         # Cash summary
         cash_amt = latest_cash.get("amount") if latest_cash else None
@@ -163,14 +271,14 @@ class Prompts:
                 )
             except Exception:
                 orders_preview = ""
-        orders_block = _df_to_text(weekly_orders) or "[sem ordens recentes]"
+        orders_block = _df_to_text(weekly_orders, ORDERS_MAX_ROWS) or "[sem ordens recentes]"
 
         # Weekly research (full text)
         last_research_date = (weekly_research or {}).get("date_str", "")
         last_research_text = (weekly_research or {}).get("text", "").strip()
 
         # Positions snapshot
-        positions_block = _df_to_text(positions_df) or "[sem posições registradas]"
+        positions_block = _df_to_text(positions_df, POSITIONS_MAX_ROWS) or "[sem posições registradas]"
 
         # Latest market prices (daily close)
         try:
@@ -186,50 +294,20 @@ class Prompts:
             price_rows = len(latest_prices_df)
             prices_block = _df_to_text(latest_prices_df) or "[sem preços disponíveis]"
 
-        prompt = (
-            "Você é um gestor estratégico de uma carteira de ações dos EUA.\n"
-            "Seu papel é criar uma teoria macro para ser seguida durante a semana, baseado nos dados recebidos sobre a carteira atual, execuções passadas, caixa disponível e acontecimentos da última semana no mundo, e decidir quais ações manter, vender ou comprar \n\n"
-            "Objetivo\n\n"
-            "- Maximizar o retorno acumulado em 5 anos.\n"
-            "- Criar uma estratégia macro para ser seguida na próxima semana.\n"
-            "- Escolher como e se mudar a carteira atual\n"
-            "- Analisar se houve mudanças consideráveis da última teoria e se é necessário mudar algo na carteira ou teoria.\n\n"
-            "Insumos recebidos hoje (dados reais)\n\n"
+        dynamic = (
             f"- Universo de tickers nas posições: {tickers_str}\n"
             f"- Caixa: amount={cash_amt}, total_portfolio_amount={total_amt}\n"
             f"- Ordens da semana (linhas: {orders_rows}; prévia: {orders_preview})\n"
             f"- Dados de preços de fechamento de hoje (linhas: {price_rows}) listados em latest_prices\n"
-            "\n--- positions snapshot ---\n"
-            f"{positions_block}\n"
-            "--- latest_prices (fechamento oficial do dia) ---\n"
-            f"{prices_block}\n"
-            "--- latest_orders (última data) ---\n"
-            f"{orders_block}\n"
-            f"--- weekly_research ({last_research_date}) ---\n"
-            f"{last_research_text}\n\n"
-            "Restrições (sempre respeitar)\n\n"
-            "- Sem alavancagem.\n"
-            "- Sem derivativos.\n"
-            "- Considerar custos de transação simbólicos a cada trade.\n"
-            "- Não concentrar >25% do portfólio em um único ativo.\n"
-            "- Manter pelo menos 10% do portfólio em caixa.\n"
-            "- Rebalancear quando necessário.\n"
-            "- Não é obrigatório agir.\n\n"
-            "Preferências de seleção (foco em small caps)\n\n"
-            "- Priorizar empresas small caps com potencial de crescimento acelerado.\n"
-            "- Em geral, preferir capitalização de mercado < US$5B;\n"
-            "  evitar large/mega caps (> US$10B), salvo catalisador excepcional.\n"
-            "- Usar a ferramenta de busca para verificar a capitalização de mercado\n"
-            "  aproximada e citar os principais catalisadores no texto de pesquisa.\n"
-            "Como responder\n\n"
-            "- research: Criação da teoria macro para a próxima semana, a estimativa de capitalização de mercado (quando relevante) e os catalisadores de crescimento.\n"
-            "- orders: Manter (sem novas ordens) OU Comprar/Vender (listar ordens com ticker, quantidade, preço-alvo aproximado).\n"
-            "Importante\n\n"
-            "- Se não houver oportunidades claras, afirme: 'Hoje não há trades recomendados.'\n"
-            "- Se houver necessidade de ajuste (ex.: concentração alta, caixa abaixo do limite, posição desalinhada da macro), proponha rebalanceamento.\n"
-            "- Sempre referenciar a coluna close de latest_prices para justificar preços de entrada/saída.\n"
+            + _context_blocks(
+                positions_block,
+                prices_block,
+                orders_block,
+                last_research_date,
+                last_research_text,
+            )
         )
-        return prompt
+        return _WEEKEND_PREFIX + dynamic + _WEEKEND_SUFFIX
 
     @staticmethod
     def quick_test_prompt() -> str:
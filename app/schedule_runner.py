@@ -1,7 +1,9 @@
 import argparse
+import heapq
 import os
+import signal
 import sys
-import time
+import threading
 from dataclasses import dataclass
 from datetime import datetime, timedelta, time as dtime
 
@@ -12,6 +14,12 @@ if __package__ is None or __package__ == "":
 
 from app import orchestrator
 
+# Set by SIGINT/SIGTERM: the scheduler stops once the current job (if any) ends
+_stop = threading.Event()
+# Upper bound for one wait, so wall-clock changes (DST, NTP, suspend) are
+# noticed within the hour instead of sleeping for days on a stale interval
+MAX_WAIT_SECONDS = 3600.0
+
 
 @dataclass
 class ScheduleConfig:
@@ -58,14 +66,40 @@ def _next_sunday_run(now: datetime, at_time: dtime) -> datetime:
     return datetime.combine(target_date, at_time)
 
 
-def _sleep_until(target: datetime):
-    while True:
-        now = datetime.now()
-        seconds = (target - now).total_seconds()
+def _compute_upcoming(
+    cfg: ScheduleConfig, now: datetime, n: int = 8
+) -> list[tuple[datetime, str]]:
+    """Return the next `n` runs after `now`, across both jobs, as a heap of (when, job)."""
+    upcoming: list[tuple[datetime, str]] = []
+    for job_name, next_run, at_time in (
+        ("weekday_processing", _next_weekday_run, cfg.weekday_at),
+        ("sunday_processing", _next_sunday_run, cfg.sunday_at),
+    ):
+        when = now
+        for _ in range(n):
+            when = next_run(when, at_time)
+            upcoming.append((when, job_name))
+    # Only the first n merged runs are complete: later slots of one job could
+    # still be missing runs of the other
+    upcoming = heapq.nsmallest(n, upcoming)
+    heapq.heapify(upcoming)
+    return upcoming
+
+
+def _sleep_until(target: datetime) -> bool:
+    """Block until `target` (local time); returns False if asked to stop first."""
+    while not _stop.is_set():
+        seconds = (target - datetime.now()).total_seconds()
         if seconds <= 0:
-            return
-        # Sleep in chunks to allow Ctrl+C responsiveness
-        time.sleep(min(seconds, 60))
+            return True
+        # One wait for the whole interval; a stop signal wakes it immediately
+        _stop.wait(min(seconds, MAX_WAIT_SECONDS))
+    return False
+
+
+def _request_stop(signum, _frame):
+    print(f"[schedule_runner] Received signal {signum}; stopping after the current job")
+    _stop.set()
 
 
 def _run_job(name: str, func):
@@ -73,7 +107,8 @@ def _run_job(name: str, func):
         f"[schedule_runner] Running job: {name} at {datetime.now().isoformat(timespec='seconds')}"
     )
     try:
-        func()
+        # The orchestrator routines are coroutines; each gets its own loop
+        orchestrator.run_routine(func)
         print(f"[schedule_runner] Job '{name}' completed")
     except Exception as exc:
         print(f"[schedule_runner] Job '{name}' failed: {exc}")
@@ -97,6 +132,9 @@ def main(argv=None):
     )
     args = parser.parse_args(argv)
 
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
     cfg = _load_config()
     print(
         f"[schedule_runner] Starting with WEEKDAY_AT={cfg.weekday_at.strftime('%H:%M')} "
@@ -108,18 +146,25 @@ def main(argv=None):
     elif args.run_now == "sunday":
         _run_job("sunday_processing", orchestrator.sunday_processing)
 
-    # Main scheduler loop
-    while True:
+    # Main scheduler loop over a heap of precomputed runs, refilled when empty
+    upcoming: list[tuple[datetime, str]] = []
+    while not _stop.is_set():
         now = datetime.now()
-        next_wd = _next_weekday_run(now, cfg.weekday_at)
-        next_sun = _next_sunday_run(now, cfg.sunday_at)
-        next_run = min(next_wd, next_sun)
-        job_name = "weekday_processing" if next_run == next_wd else "sunday_processing"
+        # Runs that came due while a long job was executing are skipped
+        while upcoming and upcoming[0][0] <= now:
+            missed, missed_job = heapq.heappop(upcoming)
+            print(
+                f"[schedule_runner] Skipping missed run: {missed_job} at {missed.isoformat(timespec='seconds')}"
+            )
+        if not upcoming:
+            upcoming = _compute_upcoming(cfg, now)
+        next_run, job_name = heapq.heappop(upcoming)
 
         print(
             f"[schedule_runner] Next run: {job_name} at {next_run.isoformat(timespec='seconds')}"
         )
-        _sleep_until(next_run)
+        if not _sleep_until(next_run):
+            break
         _run_job(
             job_name,
             (
@@ -129,6 +174,8 @@ def main(argv=None):
             ),
         )
 
+    print("[schedule_runner] Stopped")
+
 
 if __name__ == "__main__":
     main()
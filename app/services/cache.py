@@ -0,0 +1,119 @@
+"""Small on-disk TTL cache for orchestrator reads that rarely change intraday."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_CACHE_DIR = ".cache"
+_MISSING = object()
+
+
+class FileCache:
+    """Pickle-backed cache with one file per `(name, args)` entry.
+
+    Entries live under `CACHE_DIR` (default `.cache/`) as
+    `<name>-<md5(args)>.pkl`; an entry older than its TTL is refetched.
+    Writers call :meth:`invalidate` for the names their writes affect.
+    """
+
+    def __init__(self, directory: Optional[str | os.PathLike] = None):
+        self.directory = Path(directory or os.getenv("CACHE_DIR", DEFAULT_CACHE_DIR))
+
+    def get_or_fetch(
+        self,
+        name: str,
+        fetch: Callable[..., T],
+        *args: Any,
+        ttl: float,
+        **kwargs: Any,
+    ) -> T:
+        """Return the cached `fetch(*args, **kwargs)` if fresher than `ttl` seconds."""
+        path = self._path(name, args, kwargs)
+        value = self._load(path, ttl)
+        if value is not _MISSING:
+            return value
+        value = fetch(*args, **kwargs)
+        self._store(path, value)
+        return value
+
+    def get(self, name: str, *args: Any, ttl: float, default: Any = None, **kwargs: Any) -> Any:
+        """Return the entry stored by :meth:`put` if fresher than `ttl`, else `default`."""
+        value = self._load(self._path(name, args, kwargs), ttl)
+        return default if value is _MISSING else value
+
+    def put(self, name: str, value: Any, *args: Any, **kwargs: Any) -> None:
+        """Store `value` under `(name, args)`, replacing any previous entry."""
+        self._store(self._path(name, args, kwargs), value)
+
+    def invalidate(self, name: str) -> int:
+        """Drop every entry stored under `name`; returns how many were removed."""
+        removed = 0
+        for path in self.directory.glob(f"{name}-*.pkl"):
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _path(self, name: str, args: tuple, kwargs: dict) -> Path:
+        key = repr((args, sorted(kwargs.items()))).encode("utf-8")
+        digest = hashlib.md5(key, usedforsecurity=False).hexdigest()
+        return self.directory / f"{name}-{digest}.pkl"
+
+    @staticmethod
+    def _load(path: Path, ttl: float) -> Any:
+        try:
+            if time.time() - path.stat().st_mtime > ttl:
+                return _MISSING
+            with path.open("rb") as f:
+                return pickle.load(f)  # nosec: local cache written by this module
+        except FileNotFoundError:
+            return _MISSING
+        except Exception as exc:
+            print(f"[cache] Ignoring unreadable entry {path.name}: {exc}")
+            return _MISSING
+
+    def _store(self, path: Path, value: Any) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with tmp.open("wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Atomic swap: concurrent readers never see a half-written entry
+            os.replace(tmp, path)
+        except Exception as exc:
+            print(f"[cache] Failed to store {path.name}: {exc}")
+
+
+def digest(*parts: Any) -> str:
+    """md5 over `parts`, hashing DataFrames by their values and layout.
+
+    Frames go through `pd.util.hash_pandas_object` (vectorized) instead of a
+    text rendering; other parts are hashed by their repr.
+    """
+    h = hashlib.md5(usedforsecurity=False)
+    for part in parts:
+        if hasattr(part, "dtypes") and hasattr(part, "columns"):
+            import pandas as pd
+
+            h.update(repr((list(part.columns), [str(t) for t in part.dtypes])).encode())
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        else:
+            h.update(repr(part).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+__all__ = [
+    "DEFAULT_CACHE_DIR",
+    "FileCache",
+    "digest",
+]
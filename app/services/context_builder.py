@@ -5,8 +5,10 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Optional, Sequence
 
+import numpy as np
 import pandas as pd
 
+from app.data._common import unique_tickers
 from app.data.collector import get_stock_data
 from app.data.inserter import insert_latest_daily_data
 
@@ -21,6 +23,9 @@ class MarketContext:
     price_frames: Sequence[Optional[pd.DataFrame]]
     latest_prices_df: pd.DataFrame
     inserted_rows: int
+    # Position tickers as rendered in the prompts ("(none)" when only the
+    # fallback universe was used)
+    tickers_str: str = "(none)"
 
 
 def select_tickers(
@@ -34,67 +39,70 @@ def select_tickers(
     present in the positions dataframe. Leading/trailing whitespace is stripped.
     """
 
-    tickers: list[str] = []
-
-    if positions_df is not None and not positions_df.empty and "ticker" in positions_df:
-        seen: set[str] = set()
-        for raw in positions_df.get("ticker", []).astype(str).tolist():
-            value = raw.strip()
-            if value and value not in seen:
-                seen.add(value)
-                tickers.append(value)
+    tickers = _unique_tickers(positions_df)
 
     if not tickers:
         fallback_values = fallback or DEFAULT_FALLBACK_TICKERS
-        tickers = [str(t).strip() for t in fallback_values if str(t).strip()]
+        # Strip each value once instead of once for the test and once for the item
+        tickers = [t for t in map(str.strip, map(str, fallback_values)) if t]
 
     return tickers
 
 
+# yfinance column -> latest-prices column
+_LATEST_PRICE_COLUMNS = {
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+    "Volume": "volume",
+}
+
+
+def _unique_tickers(positions_df: Optional[pd.DataFrame]) -> list[str]:
+    """Stripped, non-empty tickers of `positions_df` in first-seen order."""
+    if positions_df is None or positions_df.empty or "ticker" not in positions_df.columns:
+        return []
+    return unique_tickers(positions_df["ticker"])
+
+
 def build_latest_prices_df(
     price_frames: Sequence[Optional[pd.DataFrame]],
     tickers: Sequence[str],
 ) -> pd.DataFrame:
     """Return a dataframe containing the latest OHLCV row for each ticker."""
 
-    latest_price_rows: list[dict[str, object]] = []
+    tails: list[pd.DataFrame] = []
+    dates: list[str] = []
+    names: list[str] = []
     for tkr, df in zip(tickers, price_frames):
-        if df is None or getattr(df, "empty", True):
-            continue
-        try:
-            last_idx = df.index[-1]
-            row = df.iloc[-1]
-        except Exception:
+        if df is None or df.empty:
             continue
-
-        ts = pd.Timestamp(last_idx)
+        tail = df.tail(1)
+        # Dates are taken per frame: tickers may be indexed in different zones
+        ts = pd.Timestamp(tail.index[0])
         try:
-            date_str = ts.date().isoformat()
+            dates.append(ts.date().isoformat())
         except Exception:
-            date_str = str(ts)
+            dates.append(str(ts))
+        tails.append(tail)
+        names.append(str(tkr).strip())
 
-        def _safe_float(val: object) -> Optional[float]:
-            return None if val is None or pd.isna(val) else float(val)
+    if not tails:
+        return pd.DataFrame()
 
-        volume_val = row.get("Volume")
-        if volume_val is None or pd.isna(volume_val):
-            volume = None
-        else:
-            volume = int(volume_val)
-
-        latest_price_rows.append(
-            {
-                "date": date_str,
-                "ticker": str(tkr).strip(),
-                "open": _safe_float(row.get("Open")),
-                "high": _safe_float(row.get("High")),
-                "low": _safe_float(row.get("Low")),
-                "close": _safe_float(row.get("Close")),
-                "volume": volume,
-            }
-        )
-
-    return pd.DataFrame(latest_price_rows) if latest_price_rows else pd.DataFrame()
+    out = (
+        pd.concat(tails, ignore_index=True)
+        .reindex(columns=list(_LATEST_PRICE_COLUMNS))
+        .rename(columns=_LATEST_PRICE_COLUMNS)
+    )
+    # One typed cast per column; missing values stay NaN / <NA>
+    out = out.astype(
+        {"open": "float64", "high": "float64", "low": "float64", "close": "float64"}
+    ).assign(volume=np.trunc(out["volume"].astype("float64")).astype("Int64"))
+    out.insert(0, "ticker", names)
+    out.insert(0, "date", dates)
+    return out
 
 
 def build_market_context(
@@ -104,7 +112,9 @@ def build_market_context(
 ) -> MarketContext:
     """Compose tickers, price frames, and latest-price snapshot for prompts."""
 
-    tickers = select_tickers(positions_df, fallback=fallback_tickers)
+    # The positions column is scanned once; prompts reuse the joined form
+    position_tickers = _unique_tickers(positions_df)
+    tickers = position_tickers or select_tickers(None, fallback=fallback_tickers)
     price_frames = get_stock_data(tickers)
     inserted_rows = insert_latest_daily_data(price_frames, tickers)
     latest_prices_df = build_latest_prices_df(price_frames, tickers)
@@ -113,6 +123,7 @@ def build_market_context(
         price_frames=price_frames,
         latest_prices_df=latest_prices_df,
         inserted_rows=inserted_rows,
+        tickers_str=", ".join(position_tickers) or "(none)",
     )
 
 
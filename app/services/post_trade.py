@@ -3,23 +3,27 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import date as date_type, datetime
+from datetime import date as date_type, datetime, timezone
 from typing import Iterable, Optional
 
 import math
 
 from app.data.collector import get_latest_cash_before, get_portfolio
-from app.data.inserter import insert_cash_snapshot, sync_positions_with_portfolio
+from app.data.db import get_connection, transaction
+from app.data.inserter import (
+    insert_cash_snapshot,
+    insert_new_orders_batch,
+    sync_positions_with_portfolio,
+)
 from app.openai_integration import Order
 from app.portfolio_manager import (
     CashSnapshot,
     Portfolio,
-    apply_orders,
-    compute_cash_after_orders,
+    apply_orders_with_cash,
 )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PostTradeResult:
     """Represents the persisted outcome of applying a batch of orders."""
 
@@ -46,48 +50,73 @@ def apply_orders_and_persist(
     as_of_date: Optional[date_type] = None,
     portfolio_override: Optional[Portfolio] = None,
     prior_cash_row: Optional[dict] = None,
+    conn=None,
 ) -> PostTradeResult:
     """Apply executed orders, sync positions, and write the resulting cash snapshot.
 
+    The reads and both writes run in one transaction, committed once.
+
     Args:
         orders: Executed orders to reflect in the portfolio.
         as_of_date: Optional override for the cash snapshot date (defaults to today UTC).
         portfolio_override: Optional pre-loaded portfolio to avoid re-fetching.
         prior_cash_row: Optional cached result from ``get_latest_cash_before``.
+        conn: Optional connection; an open transaction on it is joined.
     """
 
-    orders_list = [order for order in orders or []]
-
-    portfolio = portfolio_override or get_portfolio()
-    updated_portfolio = apply_orders(portfolio, orders_list)
-    position_sync = sync_positions_with_portfolio(updated_portfolio)
-
     if as_of_date is None:
-        as_of_date = datetime.utcnow().date()
-
-    prior = prior_cash_row or get_latest_cash_before(as_of_date)
-    prev_amount = prior.get("amount") if prior else None
-    previous_cash = _normalize_cash(prev_amount)
-
-    new_cash = compute_cash_after_orders(previous_cash, orders_list)
-
-    snapshot = CashSnapshot(
-        date=as_of_date,
-        amount=new_cash,
-        total_portfolio_amount=None,
-    )
-    insert_cash_snapshot(snapshot)
+        as_of_date = datetime.now(timezone.utc).date()
+
+    conn = conn or get_connection()
+    with transaction(conn):
+        portfolio = portfolio_override or get_portfolio(conn=conn)
+        prior = prior_cash_row or get_latest_cash_before(as_of_date, conn=conn)
+        prev_amount = prior.get("amount") if prior else None
+        previous_cash = _normalize_cash(prev_amount)
+
+        # Positions and cash come from one walk over the orders
+        updated_portfolio, new_cash, orders_count = apply_orders_with_cash(
+            portfolio, orders or (), previous_cash
+        )
+        position_sync = sync_positions_with_portfolio(updated_portfolio, conn=conn)
+
+        snapshot = CashSnapshot(
+            date=as_of_date,
+            amount=new_cash,
+            total_portfolio_amount=None,
+        )
+        insert_cash_snapshot(snapshot, conn=conn)
 
     return PostTradeResult(
         as_of_date=as_of_date,
         previous_cash=previous_cash,
         new_cash=new_cash,
-        orders_count=len(orders_list),
+        orders_count=orders_count,
         position_sync=position_sync,
     )
 
 
+def apply_orders_and_persist_atomic(
+    orders: Iterable[Order],
+    *,
+    as_of_date: Optional[date_type] = None,
+) -> PostTradeResult:
+    """Record executed orders and persist their effects in one transaction.
+
+    Inserts the orders, then runs :func:`apply_orders_and_persist` on the same
+    connection: either every write of the trade lands or none does.
+    """
+
+    orders_list = [order for order in orders or []]
+
+    conn = get_connection()
+    with transaction(conn):
+        insert_new_orders_batch(orders_list, conn=conn)
+        return apply_orders_and_persist(orders_list, as_of_date=as_of_date, conn=conn)
+
+
 __all__ = [
     "PostTradeResult",
     "apply_orders_and_persist",
+    "apply_orders_and_persist_atomic",
 ]
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+import httpx  # noqa: E402
+
+from app import openai_integration  # noqa: E402
+
+DECISION = {"daily_summary": "ok", "orders": [], "explanation": "none"}
+
+
+class _LoopBoundTransport(httpx.AsyncBaseTransport):
+    """Stub transport that, like a real connection pool, only works on the
+    event loop it first served a request on."""
+
+    def __init__(self):
+        self.loop = None
+        self.requests = 0
+
+    async def handle_async_request(self, request):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif self.loop is not loop:
+            raise RuntimeError("Event loop is closed")
+        self.requests += 1
+        return httpx.Response(200, json=_response_body(), request=request)
+
+
+def _response_body():
+    return {
+        "id": "resp_1",
+        "object": "response",
+        "created_at": 0,
+        "model": "gpt-4o-mini",
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": "msg_1",
+                "role": "assistant",
+                "status": "completed",
+                "content": [
+                    {"type": "output_text", "text": json.dumps(DECISION), "annotations": []}
+                ],
+            }
+        ],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": 1,
+            "output_tokens": 1,
+            "total_tokens": 2,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens_details": {"reasoning_tokens": 0},
+        },
+    }
+
+
+class SendPromptTest(unittest.TestCase):
+    def setUp(self):
+        env = {
+            "OPENAI_API_KEY": "sk-test",
+            "OPENAI_BASE_URL": "http://stub.invalid/v1",
+            "OPENAI_MAX_RETRIES": "0",
+            "OPENAI_AGENTS_DISABLE_TRACING": "1",
+        }
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.transports = []
+
+        def build_http_client(timeout_val):
+            transport = _LoopBoundTransport()
+            self.transports.append(transport)
+            return httpx.AsyncClient(transport=transport, timeout=timeout_val)
+
+        patcher = mock.patch.object(
+            openai_integration, "_build_http_client", build_http_client
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(openai_integration.close_openai_client)
+
+    def test_repeated_sync_calls_each_get_a_live_client(self):
+        first = openai_integration.send_prompt("hello")
+        second = openai_integration.send_prompt("hello again")
+
+        self.assertEqual(first.daily_summary, "ok")
+        self.assertEqual(second.daily_summary, "ok")
+        # One client per call, each used on (and closed with) its own loop
+        self.assertEqual([t.requests for t in self.transports], [1, 1])
+        self.assertEqual(openai_integration._OWNED_CLIENTS, [])
+
+
+if __name__ == "__main__":
+    unittest.main()